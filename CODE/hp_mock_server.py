@@ -0,0 +1,307 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import argparse
+import datetime
+import hashlib
+import json
+import random
+import threading
+import time
+
+# --- Local stand-in for support.hp.com ---
+# Serves recorded (or synthetic) warranty responses and a check-warranty page with the
+# same DOM hp_warranty.py drives, so both lookup backends can run without network access.
+# The JSON endpoint and response shape follow the same unverified assumptions as the
+# experimental HTTP backend; they are not a capture of the real service.
+# Point hp_warranty.py at it with
+#   python hp_warranty.py --backend http --http-base-url http://127.0.0.1:8765
+
+warranty_endpoint = "/wcc-services/profile/devices/warranty/specs"
+check_warranty_page = "/us-en/check-warranty"
+page_lookup_endpoint = "/mock/lookup"
+
+
+# --- Recorded Responses ---
+def build_recorded_device(sn, status="Active", start_date="January 1, 2023", end_date="December 31, 2026",
+                          product_number="", product_number_required=False):
+    return {
+        "serialNumber": sn,
+        "productNumber": product_number,
+        "productNumberRequired": product_number_required,
+        "warranty": {
+            "status": status,
+            "startDate": start_date,
+            "endDate": end_date,
+        },
+    }
+
+
+def build_synthetic_device(sn, prompt_rate=0.0):
+    # Deterministic per serial, so repeated benchmark runs see the same data.
+    digest = int(hashlib.sha256(sn.encode("utf-8")).hexdigest(), 16)
+    start_date = datetime.date(2020, 1, 1) + datetime.timedelta(days=digest % 1500)
+    end_date = start_date + datetime.timedelta(days=365 * (1 + (digest >> 12) % 4))
+    status = "Active" if end_date >= datetime.date.today() else "Expired"
+    product_number_required = ((digest >> 24) % 10000) / 10000 < prompt_rate
+    return build_recorded_device(sn, status, f"{start_date:%B %d, %Y}", f"{end_date:%B %d, %Y}",
+                                 product_number_required=product_number_required)
+
+
+def load_recordings(recordings_path):
+    # Recordings file: {"SERIAL": {device entry as returned by the warranty endpoint}, ...}
+    with open(recordings_path, "r", encoding="utf-8") as recordings_file:
+        recordings = json.load(recordings_file)
+    return {sn.strip().upper(): device for sn, device in recordings.items()}
+
+
+# --- Check-warranty page stand-in ---
+# Reproduces the elements hp_warranty.py relies on: the OneTrust banner (inline button or
+# iframe), #inputtextpfinder / #FindMyProduct, the productNumber prompt with
+# #FindMyProductNumber, div.info-section > div.info-item > div.label / div.text, and a
+# "not found" message for unknown serials.
+check_warranty_html = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Check Warranty (local stand-in)</title>
+<style>.hidden { display: none; }</style>
+</head>
+<body>
+<div id="onetrust-banner-sdk" class="hidden">
+    <p>We use cookies.</p>
+    <button id="onetrust-accept-btn-handler" type="button" onclick="acceptCookies()">Accept All Cookies</button>
+</div>
+<div id="onetrust-frame-holder"></div>
+<main>
+    <div class="search">
+        <input id="inputtextpfinder" type="text" placeholder="Serial number">
+        <button id="FindMyProduct" type="button" onclick="findProduct()">Submit</button>
+    </div>
+    <div id="product-number-prompt" class="hidden">
+        <input formcontrolname="productNumber" type="text" placeholder="Product number">
+        <button id="FindMyProductNumber" type="button" onclick="findProduct(true)">Submit</button>
+    </div>
+    <div id="results"></div>
+</main>
+<script>
+var cookieBanner = "__COOKIE_BANNER__";
+
+function hasConsent() {
+    return document.cookie.indexOf("OptanonAlertBoxClosed=") !== -1;
+}
+
+function acceptCookies() {
+    document.cookie = "OptanonAlertBoxClosed=" + new Date().toISOString() + "; path=/";
+    document.getElementById("onetrust-banner-sdk").remove();
+    var frame = document.getElementById("onetrust-pc-sdk");
+    if (frame) { frame.remove(); }
+}
+
+if (!hasConsent()) {
+    if (cookieBanner === "button") {
+        document.getElementById("onetrust-banner-sdk").classList.remove("hidden");
+    } else if (cookieBanner === "iframe") {
+        var frame = document.createElement("iframe");
+        frame.id = "onetrust-pc-sdk";
+        frame.srcdoc = "<button id='onetrust-accept-btn-handler' onclick='parent.acceptCookies()'>Confirm</button>";
+        document.getElementById("onetrust-frame-holder").appendChild(frame);
+    }
+}
+
+function escapeHtml(text) {
+    var div = document.createElement("div");
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function renderResult(device) {
+    var warranty = device.warranty || {};
+    var items = [
+        ["Product", ["HP Device " + device.serialNumber]],
+        ["Serial number", [device.serialNumber]],
+        ["Status", [warranty.status]],
+        ["Start date", [warranty.startDate]],
+        ["End date", [warranty.endDate]],
+        ["Coverage", ["Onsite Service", "Parts and Labour"]]
+    ];
+    var html = '<div class="info-section">';
+    items.forEach(function (item) {
+        html += '<div class="info-item"><div class="label">' + escapeHtml(item[0]) + '</div><div class="text">';
+        item[1].forEach(function (line) { html += "<p>" + escapeHtml(line || "") + "</p>"; });
+        html += "</div></div>";
+    });
+    document.getElementById("results").innerHTML = html + "</div>";
+}
+
+function findProduct(withProductNumber) {
+    var prompt = document.getElementById("product-number-prompt");
+    var serialNumber = document.getElementById("inputtextpfinder").value.trim();
+    var productNumber = withProductNumber ? prompt.querySelector("input").value.trim() : "";
+
+    // Like the real page, the previous result and prompt stay on screen until the response arrives.
+    fetch("__LOOKUP_ENDPOINT__", {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify({serialNumber: serialNumber, productNumber: productNumber})
+    }).then(function (response) {
+        document.getElementById("results").innerHTML = "";
+        if (!withProductNumber) { prompt.classList.add("hidden"); }
+        if (response.status === 404) {
+            document.getElementById("results").innerHTML =
+                '<div class="error-message" role="alert">This product cannot be identified. Serial number not found.</div>';
+            return null;
+        }
+        if (!response.ok) { return null; }
+        return response.json();
+    }).then(function (device) {
+        if (!device) { return; }
+        if (device.productNumberRequired) {
+            prompt.querySelector("input").value = "";
+            prompt.classList.remove("hidden");
+            return;
+        }
+        prompt.classList.add("hidden");
+        renderResult(device);
+    });
+}
+</script>
+</body>
+</html>
+"""
+
+
+class MockHPRequestHandler(BaseHTTPRequestHandler):
+    # recordings, request_count and stats_lock live on the server (see start_mock_server()).
+    server_version = "HPMock/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status_code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def simulate_network(self):
+        # Returns False when this request should fail with a server error.
+        delay = self.server.latency_seconds + random.uniform(0, self.server.latency_jitter_seconds)
+        if delay > 0:
+            time.sleep(delay)
+        with self.server.stats_lock:
+            self.server.request_count += 1
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.send_json(503, {"code": 503, "message": "Simulated upstream error"})
+            return False
+        return True
+
+    def resolve_device(self, sn, product_number):
+        sn = str(sn or "").strip().upper()
+        device = self.server.recordings.get(sn)
+        if device is None and self.server.synthetic and sn:
+            device = build_synthetic_device(sn, self.server.prompt_rate)
+        if device is None:
+            return None
+        device = dict(device)
+        # A product number in the request answers the prompt, as on the real page.
+        if device.get("productNumberRequired") and product_number:
+            device["productNumberRequired"] = False
+        return device
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path != check_warranty_page:
+            self.send_error(404)
+            return
+        body = (check_warranty_html
+                .replace("__COOKIE_BANNER__", self.server.cookie_banner)
+                .replace("__LOOKUP_ENDPOINT__", page_lookup_endpoint)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        content_length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request_payload = json.loads(self.rfile.read(content_length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_json(400, {"code": 400, "message": "Invalid JSON"})
+            return
+
+        if path not in (warranty_endpoint, page_lookup_endpoint):
+            self.send_json(404, {"code": 404, "message": f"Unknown endpoint {path}"})
+            return
+        if not self.simulate_network():
+            return
+
+        if path == page_lookup_endpoint:
+            # XHR made by the stand-in page itself.
+            device = self.resolve_device(request_payload.get("serialNumber"), request_payload.get("productNumber"))
+            if device is None:
+                self.send_json(404, {"code": 404, "message": "Serial number not found"})
+            else:
+                self.send_json(200, device)
+            return
+
+        devices = []
+        for requested in request_payload.get("deviceList") or []:
+            device = self.resolve_device(requested.get("serialNumber"), requested.get("productNumber"))
+            if device is not None:
+                devices.append(device)
+        self.send_json(200, {"code": 200, "data": {"devices": devices}})
+
+
+def start_mock_server(recordings=None, host="127.0.0.1", port=0, latency_ms=0, latency_jitter_ms=0,
+                      error_rate=0.0, prompt_rate=0.0, cookie_banner="button", synthetic=False):
+    server = ThreadingHTTPServer((host, port), MockHPRequestHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    server.recordings = {sn.strip().upper(): device for sn, device in (recordings or {}).items()}
+    # Behaviour knobs: added latency per request, fraction of 503 responses, fraction of
+    # synthetic serials that need the product number prompt, and the cookie banner style
+    # ("button", "iframe" or "none"). Unknown serials get synthetic data when synthetic=True.
+    server.latency_seconds = latency_ms / 1000
+    server.latency_jitter_seconds = latency_jitter_ms / 1000
+    server.error_rate = error_rate
+    server.prompt_rate = prompt_rate
+    server.cookie_banner = cookie_banner
+    server.synthetic = synthetic
+    server.request_count = 0
+    server.stats_lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    return server, base_url
+
+
+# --- Main Script Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded HP warranty responses locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recordings", help="JSON file mapping serial numbers to recorded device entries.")
+    parser.add_argument("--synthetic", action="store_true", help="Answer unknown serials with generated warranty data.")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency per request.")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra latency per request (0..jitter).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503.")
+    parser.add_argument("--prompt-rate", type=float, default=0.0, help="Fraction of synthetic serials that need a product number.")
+    parser.add_argument("--cookie-banner", choices=["button", "iframe", "none"], default="button")
+    args = parser.parse_args()
+
+    recordings = load_recordings(args.recordings) if args.recordings else {}
+    server, base_url = start_mock_server(recordings, args.host, args.port, args.latency_ms, args.jitter_ms,
+                                         args.error_rate, args.prompt_rate, args.cookie_banner, args.synthetic)
+    print(f"Mock HP warranty service listening on {base_url} with {len(recordings)} recorded serial(s). Press Ctrl+C to stop.")
+    print(f"Check-warranty page: {base_url}{check_warranty_page}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print("Mock server stopped.")
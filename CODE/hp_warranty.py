@@ -5,14 +5,58 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException, NoSuchFrameException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException, NoSuchFrameException, SessionNotCreatedException
 from webdriver_manager.chrome import ChromeDriverManager
+import requests
+from requests.adapters import HTTPAdapter
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+try:
+    import httpx  # Optional: enables the native async HTTP backend for --engine async.
+except ImportError:
+    httpx = None
+import argparse
+import asyncio
+import atexit
+import collections
+import concurrent.futures
+import csv
+import datetime
+import heapq
+import itertools
 import os
+import sqlite3
+import random
+import shutil
+import socket
+import time
+import json
+import logging
+import logging.handlers
+import math
+import queue
+import sys
+import threading
 
 # --- Script Configuration ---
 serial_number_file = "C:/Users/uhfnb/OneDrive - Barnes Group Inc/Dokumente/Code/Python/serials.xlsx"
 output_excel_file = "warranty_results.xlsx"
+# Append-only JSON-lines journal; every result is written here as it arrives.
+# The reports are only rendered from it at the end of a run (or with --export).
+results_journal_file = "warranty_results.jsonl"
+# Report formats written at the end of a run: "csv", "parquet" (needs pyarrow), "sqlite"
+# and "xlsx". Start/End Date are parsed into real dates once, on export; Parquet stores them
+# as date32 and SQLite as ISO text, so "expiring within 90 days" needs no reparsing downstream.
+output_formats = ["csv", "xlsx"]
+output_files = {
+    "csv": "warranty_results.csv",
+    "parquet": "warranty_results.parquet",
+    "sqlite": "warranty_results.sqlite",
+    "xlsx": output_excel_file,
+}
+output_batch_rows = 5000
 website_url = "https://support.hp.com/us-en/check-warranty"
+browser_user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.88 Safari/537.36"
 
 serial_number_column_name = "Serial Number"
 product_number_column_name = "Model Number"
@@ -30,397 +74,2862 @@ output_columns_order = [
     output_new_start_date_header,
     output_new_end_date_header
 ]
+output_date_columns = [output_new_start_date_header, output_new_end_date_header]
+
+# Number of parallel workers (each with its own lookup backend) pulling from the shared work queue.
+num_workers = 4
+
+# Sharded runs across several hosts (--mode coordinator / worker / merge): the coordinator
+# splits the input into shards of shard_size unique serials inside shard_store_file, a SQLite
+# file every host can reach (e.g. on a network share). Workers lease one shard at a time and
+# renew the lease while they work; a lease that is not renewed for shard_lease_seconds is
+# handed to the next worker that asks, which skips the serials already reported.
+shard_store_file = "warranty_shards.sqlite"
+shard_size = 500
+shard_lease_seconds = 300
+shard_poll_seconds = 15
+# A shard that still holds transient failures, or serials without any result, after a pass
+# goes back to pending and can be claimed again after shard_retry_delay_seconds, up to
+# shard_max_passes claims; after that it is marked done (or "incomplete" if serials are still
+# missing). Workers started later reopen incomplete shards and done ones with transient failures.
+shard_max_passes = 3
+shard_retry_delay_seconds = 120
+
+# Lookup backend:
+#   "selenium"      - drive Chrome through the check-warranty page (original flow)
+#   "http"          - EXPERIMENTAL: replay the page's JSON request directly; unresolved serials are recorded as such
+#   "http+selenium" - EXPERIMENTAL: try HTTP first and fall back to Selenium for serials it cannot resolve
+# The HTTP backends are experimental: the endpoint, payload and response shape below are
+# inferred from the page, not from a captured request, and hp_mock_server.py serves the
+# same assumed shape. Verify them against a real capture before relying on these backends.
+lookup_backend = "selenium"
+# The warranty widget on the check-warranty page posts to this endpoint. Point
+# http_api_base_url at hp_mock_server.py to run against recorded responses.
+http_api_base_url = "https://support.hp.com"
+http_warranty_endpoint = "/wcc-services/profile/devices/warranty/specs"
+http_timeout_seconds = 20
+http_pool_size = 4
+
+# Lookup engine:
+#   "threads" - num_workers threads, each with its own backend
+#   "async"   - one asyncio event loop driving up to async_max_concurrency lookups at once
+lookup_engine = "threads"
+async_max_concurrency = 16
+# Token bucket shared by all async lookups so support.hp.com does not throttle us (0 disables).
+rate_limit_per_second = 4.0
+rate_limit_burst = 8
+# Failure triage (both engines): transient statuses are re-queued behind the rest of the run
+# with exponential backoff, up to retry_max_attempts per serial and a run-wide budget of
+# retry_budget_min + retry_budget_ratio * lookups retries. Other error statuses are final.
+# Transient failures left in the journal are looked up again when a run resumes. "HTTP Error"
+# covers connection failures, 5xx, 408 and 429; other 4xx are the final "HTTP Client Error".
+transient_statuses = {
+    "Processing Error", "Navigation Timeout", "Dynamic Detection Error", "Scraping Timeout",
+    "Info Section Timeout", "Global Timeout", "WebDriver Session Lost", "Unhandled Script Error", "HTTP Error",
+}
+retry_max_attempts = 3
+retry_budget_ratio = 0.2
+retry_budget_min = 10
+retry_base_delay_seconds = 5
+retry_max_delay_seconds = 120
+# Throttling guard: when failure_spike_rate of the recent lookups (up to failure_window_size)
+# failed transiently, halve the number of lookups running at once; one slot is given back
+# after every concurrency_recovery_successes successful lookups in a row.
+failure_window_size = 40
+failure_spike_rate = 0.3
+concurrency_recovery_successes = 20
+
+# Lean browser profile: run headless and block page weight the scrape never reads.
+# Set headless_mode to False to watch the browser while debugging.
+headless_mode = True
+headless_window_size = "1280,800"
+block_heavy_resources = True
+# Stylesheets are left alone by default because the visibility waits depend on layout.
+block_stylesheets = False
+blocked_url_patterns = [
+    # Images and media
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp",
+    "*.mp4", "*.webm", "*.mp3", "*.ogg",
+    # Fonts
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    # Third-party analytics and trackers
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*hotjar.com*", "*demdex.net*", "*omtrdc.net*",
+    "*adobedtm.com*", "*qualtrics.com*", "*bing.com/bat*", "*linkedin.com/px*",
+]
+blocked_stylesheet_patterns = ["*.css"]
+
+# chromedriver provisioning: resolved once, then reused from chromedriver_cache_file on
+# later runs and session restarts. Pin chromedriver_path (or chromedriver_version) to avoid
+# surprises; offline_mode never touches the network (also enabled by HP_WARRANTY_OFFLINE=1).
+chromedriver_path = None
+chromedriver_version = None
+chromedriver_cache_file = "chromedriver_path.json"
+offline_mode = os.environ.get("HP_WARRANTY_OFFLINE", "") in ("1", "true", "yes")
+# Number of pre-warmed spare browsers kept ready to replace a lost session (0 disables).
+warm_spare_drivers = 1
+
+# Session reuse: accept cookie consent once per browser, persist the cookies for
+# new/restarted sessions, and reset the search form in place instead of reloading.
+reuse_browser_session = True
+session_cookie_file = "hp_session_cookies.json"
+consent_cookie_name = "OptanonAlertBoxClosed"
+# Text of the consent button when the banner is shown inline rather than in an iframe.
+cookie_accept_button_pattern = "Accept|Alle Cookies akzeptieren|Ich stimme zu"
+# No implicit wait: it stacks with the explicit waits and stalls every find_element miss.
+implicit_wait_seconds = 0
+# Results left over from the previous serial are tagged so the waits ignore them.
+info_section_selector = "div.info-section:not([data-previous-result])"
+
+# Local warranty cache shared across runs, keyed by (Serial Number, Product Number Used).
+# Error statuses are never cached; Active warranties close to their End Date expire sooner.
+use_warranty_cache = True
+warranty_cache_file = "warranty_cache.sqlite"
+cache_ttl_days = 30
+cache_near_expiry_ttl_days = 1
+cache_near_expiry_window_days = 45
+error_statuses = {
+    "Processing Error", "Navigation Timeout", "Dynamic Detection Error", "Scraping Error",
+    "Scraping Timeout", "Unhandled Scraping Error", "Info Section Timeout", "Info Section Error",
+    "Global Timeout", "WebDriver Session Lost", "Unhandled Script Error", "Lookup Failed", "Not Found",
+    "Serial Not Found", "Product Number Required", "HTTP Error", "HTTP Client Error",
+}
+
+# Run profile: per-stage timers and status counters, summarised at the end of the run.
+# Every timed stage is also written to trace_file as one JSON line (None disables the trace).
+trace_file = "warranty_trace.jsonl"
+
+# Page waits: each stage waits on a MutationObserver inside the page and returns as soon
+# as the expected element (or a "not found" message) shows up. Timeouts start at the
+# stage maximum and shrink towards what recent runs actually needed (kept in wait_profile_file).
+wait_profile_file = "wait_profile.json"
+wait_stage_max_seconds = {
+    "cookie_banner": 10,
+    "cookie_iframe_button": 10,
+    "search_form": 60,
+    "submit_button": 60,
+    "prompt_or_result": 30,
+    "result_after_prompt": 60,
+    "info_section": 60,
+}
+wait_min_seconds = 5
+wait_learned_multiplier = 3.0
+wait_learned_margin_seconds = 2.0
+wait_min_samples = 10
+wait_poll_seconds = 0.1
+negative_signal_selector = "div.error-message, .errorTxt, [role='alert'], .alert-danger"
+negative_signal_patterns = [
+    r"not (be )?found",
+    r"invalid serial",
+    r"could ?n[o']t find",
+    r"unable to (find|locate)",
+]
+
+# Logging and progress: log records go through a queue to a background listener thread, so
+# lookups never wait on the console. log_level "DEBUG" shows every step of every lookup;
+# "INFO" shows run-level messages plus one aggregated progress line (rate, ETA) every
+# progress_interval_seconds. log_file keeps a timestamped copy of the log, and progress_file
+# gets each progress snapshot as a JSON line for unattended runs (None disables either).
+log_level = "INFO"
+log_file = None
+progress_interval_seconds = 5
+progress_file = None
+
+log = logging.getLogger("hp_warranty")
+log_listener = None
+
+
+# --- Logging (queue handler, background listener) ---
+def setup_logging(level=None, log_path=None):
+    global log_listener
+    stop_logging()
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+    handlers = [console_handler]
+    if log_path:
+        file_handler = logging.FileHandler(log_path, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s [%(threadName)s] %(message)s"))
+        handlers.append(file_handler)
+    log_queue = queue.SimpleQueue()
+    log.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    log.setLevel(level or log_level)
+    log.propagate = False
+    log_listener = logging.handlers.QueueListener(log_queue, *handlers)
+    log_listener.start()
+    # exit() in the main block must not drop the lines still in the queue.
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    # Writes out whatever is still queued.
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+
+# --- chromedriver Provisioning ---
+chromedriver_lock = threading.Lock()
+resolved_chromedriver_path = None
+chromedriver_download_failed = False
+
+
+def resolve_chromedriver_path(refresh=False, stale_path=None):
+    # Returns a local chromedriver path, or None to let Selenium find one itself.
+    # stale_path: the path that just failed; only the first worker to report it re-resolves.
+    global resolved_chromedriver_path, chromedriver_download_failed
+    with chromedriver_lock:
+        if resolved_chromedriver_path and (not refresh or (stale_path and resolved_chromedriver_path != stale_path)):
+            return resolved_chromedriver_path
+
+        if chromedriver_path:
+            if not os.path.exists(chromedriver_path):
+                raise ValueError(f"Pinned chromedriver_path '{chromedriver_path}' does not exist.")
+            resolved_chromedriver_path = chromedriver_path
+            return resolved_chromedriver_path
+
+        if not refresh and os.path.exists(chromedriver_cache_file):
+            try:
+                with open(chromedriver_cache_file, "r", encoding="utf-8") as cache_file:
+                    cached = json.load(cache_file)
+                if os.path.exists(cached.get("path", "")) and cached.get("version") == chromedriver_version:
+                    resolved_chromedriver_path = cached["path"]
+                    log.info(f"Using cached chromedriver: {resolved_chromedriver_path}")
+                    return resolved_chromedriver_path
+            except (OSError, ValueError) as e:
+                log.warning(f"Warning: Could not read '{chromedriver_cache_file}': {e}")
+
+        if offline_mode:
+            # Selenium Manager must not go online either.
+            os.environ.setdefault("SE_OFFLINE", "true")
+            resolved_chromedriver_path = shutil.which("chromedriver")
+            if resolved_chromedriver_path is None:
+                log.info("Offline mode: no cached or pinned chromedriver and none on PATH. Leaving it to Selenium.")
+            return resolved_chromedriver_path
+
+        if refresh or not chromedriver_download_failed:
+            log.info("Resolving chromedriver (one-time download/version check)...")
+            try:
+                resolved_chromedriver_path = ChromeDriverManager(driver_version=chromedriver_version).install()
+            except (requests.RequestException, OSError, ValueError) as e:
+                # e.g. an air-gapped host without --offline; only tried once per run.
+                chromedriver_download_failed = True
+                log.warning(f"Warning: Could not resolve chromedriver ({type(e).__name__}: {e}). "
+                            "Falling back to chromedriver on PATH or Selenium Manager.")
+            else:
+                try:
+                    with open(chromedriver_cache_file, "w", encoding="utf-8") as cache_file:
+                        json.dump({"path": resolved_chromedriver_path, "version": chromedriver_version}, cache_file)
+                except OSError as e:
+                    log.warning(f"Warning: Could not save '{chromedriver_cache_file}': {e}")
+                return resolved_chromedriver_path
+
+        resolved_chromedriver_path = shutil.which("chromedriver")
+        return resolved_chromedriver_path
 
 
 # --- Function to Setup Chrome WebDriver ---
 def setup_driver():
     chrome_options = Options()
     chrome_options.add_argument("--log-level=3")
-    # chrome_options.add_argument("--headless")
+    if headless_mode:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument(f"--window-size={headless_window_size}")
+    else:
+        chrome_options.add_argument("--window-size=1920,1080")
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--window-size=1920,1080")
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.88 Safari/537.36")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--mute-audio")
+    if block_heavy_resources:
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.media_stream": 2,
+        })
+    chrome_options.add_argument(f"user-agent={browser_user_agent}")
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option('useAutomationExtension', False)
 
-    print("Setting up Chrome WebDriver...")
+    log.debug("Setting up Chrome WebDriver...")
     try:
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver_path = resolve_chromedriver_path()
+        service = Service(driver_path) if driver_path else Service()
+        try:
+            driver = webdriver.Chrome(service=service, options=chrome_options)
+        except SessionNotCreatedException as e:
+            # Chrome updated itself past the cached chromedriver; resolve a matching one once.
+            if chromedriver_path or not driver_path or "version" not in str(e).lower():
+                raise
+            log.warning(f"Warning: chromedriver '{driver_path}' does not match the installed Chrome. Resolving it again...")
+            driver_path = resolve_chromedriver_path(refresh=True, stale_path=driver_path)
+            service = Service(driver_path) if driver_path else Service()
+            driver = webdriver.Chrome(service=service, options=chrome_options)
         # Using implicit wait for general element presence,
         # but explicit waits are used for specific interactions.
-        driver.implicitly_wait(15)
+        driver.implicitly_wait(implicit_wait_seconds)
+        # The page waits run as async scripts, so allow them to outlive the longest stage.
+        driver.set_script_timeout(max(wait_stage_max_seconds.values()) + 10)
+        if block_heavy_resources:
+            apply_request_blocking(driver)
         return driver
-    except ValueError as e:
-        print("\n---")
-        print("ERROR: Could not start Chrome. Please ensure Google Chrome is installed on your system.")
-        print(f"DETAILS: {e}")
-        print("---\n")
+    except (ValueError, WebDriverException) as e:
+        log.error(f"ERROR: Could not start Chrome. Please ensure Google Chrome is installed on your system. DETAILS: {e}")
         return None
 
-# --- Function to Handle Cookie Consent ---
-def handle_cookie_consent(driver, wait_time=10):
-    local_wait = WebDriverWait(driver, wait_time)
 
-    print("    - Attempting to handle cookie banner...")
+# --- Pre-warmed Spare Browsers ---
+class SpareDriverPool:
+    # Keeps warm_spare_drivers browsers started and past the consent banner in the
+    # background, so a lost session is replaced by a swap instead of a cold launch.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spares = []
+        self.warming = 0
+        self.closed = False
+
+    def ensure_warming(self):
+        with self.lock:
+            missing = warm_spare_drivers - len(self.spares) - self.warming
+            if self.closed or missing <= 0:
+                return
+            self.warming += missing
+        for _ in range(missing):
+            threading.Thread(target=self.warm_one, name="spare-driver-warmer", daemon=True).start()
+
+    def warm_one(self):
+        driver = None
+        warmed = False
+        try:
+            driver = setup_driver()
+            session_state = prepare_session(driver) if driver is not None else None
+            warmed = driver is not None
+        except Exception as e:
+            log.warning(f"Warning: Could not warm a spare browser: {type(e).__name__}: {e}")
+        finally:
+            with self.lock:
+                self.warming -= 1
+                if warmed and not self.closed:
+                    self.spares.append((driver, session_state))
+                    driver = None
+        if driver is not None:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+    def take(self):
+        with self.lock:
+            spare = self.spares.pop() if self.spares else None
+        # Start replacing it straight away.
+        self.ensure_warming()
+        return spare
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            spares, self.spares = self.spares, []
+        for driver, _ in spares:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+
+spare_drivers = SpareDriverPool()
+
+
+# --- Function to Block Heavy Requests via Chrome DevTools ---
+def apply_request_blocking(driver):
+    patterns = list(blocked_url_patterns)
+    if block_stylesheets:
+        patterns += blocked_stylesheet_patterns
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        log.debug(f"    - Blocking {len(patterns)} heavy/third-party URL pattern(s) via DevTools.")
+        return True
+    except WebDriverException as e:
+        # Blocking is an optimisation only; the scrape still works without it.
+        log.warning(f"    - Warning: Could not enable DevTools request blocking: {e}")
+        return False
+
+
+# --- Function to Handle Cookie Consent ---
+def handle_cookie_consent(driver):
+    log.debug("    - Attempting to handle cookie banner...")
     try:
         driver.switch_to.default_content()
     except WebDriverException as e:
-        print(f"    - Warning: Could not switch to default content initially: {e}")
+        log.warning(f"    - Warning: Could not switch to default content initially: {e}")
         pass
 
     try:
-        # Try to accept the cookie button directly (common case)
-        cookie_button = local_wait.until(EC.element_to_be_clickable((By.XPATH,
-            "//button[contains(.,'Accept') or contains(.,'Alle Cookies akzeptieren') or contains(.,'Accept All') or contains(.,'Ich stimme zu')]"
-        )))
-        cookie_button.click()
-        print("    - Accepted cookie policy directly.")
-        # No time.sleep here, next wait will handle the page state
-        return True
-    except (TimeoutException, NoSuchElementException):
-        pass # Button not found directly, proceed to check for iframe
+        # One learned wait for whichever banner shows up: the inline button or the consent iframe.
+        banner_state, banner_element = wait_for_page_state(driver, "cookie_banner", [
+            ("accept_button", "button", True, cookie_accept_button_pattern),
+            ("consent_iframe", "#onetrust-pc-sdk", False),
+        ])
+    except TimeoutException as e:
+        log.warning(f"    - Cookie banner not found (Timeout): {e.msg}. Cookie banner not handled.")
+        return False
     except Exception as e:
-        print(f"    - Unexpected error trying to click cookie button directly: {type(e).__name__}: {e}")
+        log.warning(f"    - Unforeseen error while waiting for the cookie banner: {type(e).__name__}: {e}. Cookie banner not handled.")
+        return False
 
-    try:
-        # Check for cookie iframe
-        iframe_element = local_wait.until(EC.presence_of_element_located((By.ID, "onetrust-pc-sdk")))
+    if banner_state == "accept_button":
         try:
-            driver.switch_to.frame(iframe_element)
-            print("    - Switched to cookie consent iframe.")
-            cookie_button_in_iframe = local_wait.until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler")))
-            cookie_button_in_iframe.click()
-            print("    - Accepted cookie policy within iframe.")
+            banner_element.click()
+            log.debug("    - Accepted cookie policy directly.")
+            # No time.sleep here, next wait will handle the page state
             return True
-        except (TimeoutException, NoSuchElementException) as nested_e:
-            print(f"    - Timeout/No such element *inside* cookie iframe: {type(nested_e).__name__}. Cookie banner not handled.")
-            return False
-        except NoSuchFrameException as nested_e:
-            print(f"    - Warning: Cookie iframe disappeared or became invalid before interaction: {nested_e.msg}. Cookie banner not handled.")
-            return False
-        except WebDriverException as nested_e:
-            print(f"    - WebDriver Error *inside* cookie iframe handling block: {type(nested_e).__name__}: {nested_e}. Cookie banner not handled.")
-            return False
-        except Exception as nested_e:
-            print(f"    - Unforeseen error *inside* cookie iframe handling block: {type(nested_e).__name__}: {nested_e}. Cookie banner not handled.")
+        except Exception as e:
+            log.warning(f"    - Unexpected error trying to click cookie button directly: {type(e).__name__}: {e}. Cookie banner not handled.")
             return False
-        finally:
-            try:
-                driver.switch_to.default_content()
-                print("    - Switched back to main content from iframe block.")
-            except WebDriverException as e:
-                print(f"    - Warning: Could not switch to default content in iframe finally block: {e}")
-                pass
-    except (TimeoutException, NoSuchElementException) as e:
-        print(f"    - Cookie iframe element not found (Timeout/No Such Element): {type(e).__name__}. Cookie banner not handled.")
-    except Exception as e:
-        print(f"    - Unforeseen error trying to locate cookie iframe element: {type(e).__name__}: {e}. Cookie banner not handled.")
 
-    print("    - Cookie banner not handled.")
-    return False
+    try:
+        driver.switch_to.frame(banner_element)
+        log.debug("    - Switched to cookie consent iframe.")
+        cookie_button_in_iframe = wait_for_element(driver, "cookie_iframe_button", "#onetrust-accept-btn-handler")
+        cookie_button_in_iframe.click()
+        log.debug("    - Accepted cookie policy within iframe.")
+        return True
+    except TimeoutException as nested_e:
+        log.warning(f"    - Timeout *inside* cookie iframe: {nested_e.msg}. Cookie banner not handled.")
+        return False
+    except NoSuchFrameException as nested_e:
+        log.warning(f"    - Warning: Cookie iframe disappeared or became invalid before interaction: {nested_e.msg}. Cookie banner not handled.")
+        return False
+    except WebDriverException as nested_e:
+        log.warning(f"    - WebDriver Error *inside* cookie iframe handling block: {type(nested_e).__name__}: {nested_e}. Cookie banner not handled.")
+        return False
+    except Exception as nested_e:
+        log.warning(f"    - Unforeseen error *inside* cookie iframe handling block: {type(nested_e).__name__}: {nested_e}. Cookie banner not handled.")
+        return False
+    finally:
+        try:
+            driver.switch_to.default_content()
+            log.debug("    - Switched back to main content from iframe block.")
+        except WebDriverException as e:
+            log.warning(f"    - Warning: Could not switch to default content in iframe finally block: {e}")
+            pass
+
 
+# --- Run Profile (stage timers, status counters, trace file) ---
+class RunProfiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.run_started = time.perf_counter()
+        self.stage_durations = {}
+        self.status_counts = {}
+        self.serials_recorded = 0
+        self.trace = None
 
-# --- Main Script Execution ---
-if __name__ == "__main__":
-    driver = None
-    df_output = pd.DataFrame(columns=output_columns_order)
+    def open_trace(self, trace_path):
+        self.trace = open(trace_path, "a", encoding="utf-8") if trace_path else None
+        if self.trace is not None:
+            # Runs are appended to the same file; each starts with a marker and ends with its summary.
+            self.trace.write(json.dumps({"ts": round(time.time(), 3), "stage": "run_start"}) + "\n")
+
+    def record(self, stage, stage_started, sn=None):
+        duration = time.perf_counter() - stage_started
+        with self.lock:
+            self.stage_durations.setdefault(stage, []).append(duration)
+            if self.trace is not None:
+                self.trace.write(json.dumps({
+                    "ts": round(time.time() - duration, 3),
+                    "stage": stage,
+                    "seconds": round(duration, 4),
+                    "serial": sn,
+                    "thread": threading.current_thread().name,
+                }) + "\n")
+        return duration
+
+    def count_status(self, status):
+        with self.lock:
+            self.serials_recorded += 1
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    @staticmethod
+    def percentile(sorted_values, percent):
+        # Nearest-rank percentile.
+        index = max(0, min(len(sorted_values) - 1, math.ceil(percent * len(sorted_values) / 100) - 1))
+        return sorted_values[index]
+
+    def summary(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.run_started
+            stages = {}
+            for stage, durations in self.stage_durations.items():
+                durations = sorted(durations)
+                stages[stage] = {
+                    "count": len(durations),
+                    "mean": sum(durations) / len(durations),
+                    "p50": self.percentile(durations, 50),
+                    "p95": self.percentile(durations, 95),
+                    "p99": self.percentile(durations, 99),
+                }
+            return {
+                "elapsed_seconds": elapsed,
+                "serials": self.serials_recorded,
+                "serials_per_minute": self.serials_recorded / elapsed * 60 if elapsed > 0 else 0.0,
+                "stages": stages,
+                "statuses": dict(self.status_counts),
+            }
+
+    def print_summary(self):
+        summary = self.summary()
+        log.info(f"Run profile: {summary['serials']} serial(s) in {summary['elapsed_seconds']:.1f}s "
+                 f"({summary['serials_per_minute']:.1f} serials/min)")
+        if summary["stages"]:
+            log.info(f"    {'Stage':<22}{'Count':>8}{'Mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+            for stage, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["mean"] * item[1]["count"]):
+                log.info(f"    {stage:<22}{stats['count']:>8}{stats['mean']:>8.2f}s{stats['p50']:>8.2f}s{stats['p95']:>8.2f}s{stats['p99']:>8.2f}s")
+        if summary["statuses"]:
+            log.info("    Status breakdown:")
+            for status, count in sorted(summary["statuses"].items(), key=lambda item: -item[1]):
+                log.info(f"        {status:<28}{count:>8} ({count / max(1, summary['serials']) * 100:.1f}%)")
+
+    def close(self):
+        summary = self.summary()
+        with self.lock:
+            if self.trace is not None:
+                # Last line of the trace is the summary, so one file holds the whole run.
+                self.trace.write(json.dumps({"stage": "run_summary", "summary": summary}) + "\n")
+                self.trace.close()
+                self.trace = None
+
+
+profiler = RunProfiler()
+
+
+# --- Session State: consent cookies and in-place form reset ---
+session_cookie_lock = threading.Lock()
+
+
+def find_elements_now(driver, by, value):
+    # Presence check without stalling on the implicit wait.
+    driver.implicitly_wait(0)
+    try:
+        return driver.find_elements(by, value)
+    finally:
+        driver.implicitly_wait(implicit_wait_seconds)
+
+
+def has_consent_cookie(driver):
+    try:
+        return driver.get_cookie(consent_cookie_name) is not None
+    except WebDriverException:
+        return False
+
+
+def save_session_cookies(driver):
+    try:
+        cookies = driver.get_cookies()
+        with session_cookie_lock:
+            with open(session_cookie_file, "w", encoding="utf-8") as cookie_file:
+                json.dump(cookies, cookie_file)
+        log.debug(f"    - Saved {len(cookies)} session cookie(s) to '{session_cookie_file}'.")
+    except Exception as e:
+        log.warning(f"    - Warning: Could not save session cookies: {e}")
 
-    # Resume Logic: Load existing results
-    processed_serials = set()
-    if os.path.exists(output_excel_file):
-        print(f"'{output_excel_file}' found. Checking for previously processed serial numbers...")
+
+def load_session_cookies(driver):
+    with session_cookie_lock:
+        if not os.path.exists(session_cookie_file):
+            return 0
         try:
-            df_existing_results = pd.read_excel(output_excel_file)
-            if "Serial Number" in df_existing_results.columns:
-                processed_serials = set(df_existing_results["Serial Number"].astype(str).tolist())
-                df_output = df_existing_results.copy()
-                print(f"Found {len(processed_serials)} serial numbers already processed.")
-            else:
-                print(f"Warning: 'Serial Number' column not found in '{output_excel_file}'. Starting fresh.")
+            with open(session_cookie_file, "r", encoding="utf-8") as cookie_file:
+                cookies = json.load(cookie_file)
         except Exception as e:
-            print(f"Error reading existing results file '{output_excel_file}': {e}. Starting fresh.")
+            log.warning(f"    - Warning: Could not read '{session_cookie_file}': {e}")
+            return 0
+
+    loaded = 0
+    for cookie in cookies:
+        # Chrome rejects some keys it hands out itself (e.g. sameSite variants from other builds).
+        cookie = {key: value for key, value in cookie.items() if key in ("name", "value", "domain", "path", "secure", "httpOnly", "expiry")}
+        try:
+            driver.add_cookie(cookie)
+            loaded += 1
+        except WebDriverException:
+            continue
+    return loaded
+
+
+def prepare_session(driver):
+    # Warm a fresh driver once: restore saved cookies, accept consent if still needed.
+    session_state = {"in_place_reset": reuse_browser_session}
+    if not reuse_browser_session:
+        return session_state
+
+    try:
+        driver.get(website_url)
+        if load_session_cookies(driver):
+            driver.get(website_url)
+            log.debug("    - Restored saved session cookies.")
+        if has_consent_cookie(driver):
+            log.debug("    - Cookie consent already given for this session.")
+        elif handle_cookie_consent(driver):
+            save_session_cookies(driver)
+    except WebDriverException as e:
+        log.warning(f"    - Warning: Could not warm up the browser session: {e}")
+    return session_state
+
+
+def open_lookup_form(driver, session_state):
+    # A "not found" message or product number prompt left on the page would satisfy the next
+    # serial's waits straight away, so the lookup after one starts from a fresh page.
+    reload_once = bool(session_state) and session_state.pop("reload_next", False)
+    if session_state and session_state.get("in_place_reset") and not reload_once:
+        input_boxes = find_elements_now(driver, By.ID, "inputtextpfinder")
+        if input_boxes and input_boxes[0].is_displayed():
+            driver.execute_script(
+                "document.querySelectorAll('div.info-section').forEach(function (el) {"
+                " el.setAttribute('data-previous-result', '1'); });"
+            )
+            log.debug("    - Reusing the loaded search form in place.")
+            return "in-place"
+
+    stage_started = time.perf_counter()
+    driver.get(website_url)
+    profiler.record("navigate", stage_started)
+    # Removed time.sleep(3) here. WebDriverWait below will wait for the input box.
+
+    if session_state and reuse_browser_session and has_consent_cookie(driver):
+        log.debug("    - Cookie consent already given. Skipping cookie banner handling.")
     else:
-        print(f"'{output_excel_file}' not found. Starting a new results file.")
+        stage_started = time.perf_counter()
+        cookie_handled = handle_cookie_consent(driver)
+        profiler.record("cookie_consent", stage_started)
+        if not cookie_handled:
+            log.warning("    - Warning: Cookie banner could not be handled. This might affect subsequent steps.")
+        elif reuse_browser_session:
+            save_session_cookies(driver)
+    # Removed time.sleep(2) here. The next wait will handle the page state after cookie interaction.
+    return "navigate"
 
 
-    # Read Input Serial Numbers
-    if not os.path.exists(serial_number_file):
-        print(f"\nERROR: The file '{serial_number_file}' was not found.")
-        print("Please ensure the Excel file exists at the specified path.")
-        exit()
+# --- Info Section Extraction ---
+# Collects every label/value pair of the info section in a single WebDriver round trip.
+# Mirrors the per-element path: <p> lines joined with newlines, else the text div itself.
+extract_info_items_script = """
+var section = arguments[0];
+var pairs = [];
+section.querySelectorAll('div.info-item').forEach(function (item) {
+    var labelElem = item.querySelector('div.label');
+    var textElem = item.querySelector('div.text');
+    if (!labelElem || !textElem) {
+        return;
+    }
+    var value;
+    var pTags = textElem.querySelectorAll('p');
+    if (pTags.length) {
+        value = Array.prototype.map.call(pTags, function (p) { return (p.innerText || '').trim(); })
+            .filter(function (line) { return line; })
+            .join('\\n');
+    } else {
+        value = (textElem.innerText || '').trim();
+    }
+    pairs.push([(labelElem.innerText || '').trim(), value]);
+});
+return pairs;
+"""
 
+
+def extract_info_items(driver, info_section_element):
     try:
-        df_input_serials = pd.read_excel(serial_number_file)
-        required_columns = [serial_number_column_name, product_number_column_name, input_device_name_column_name]
-        for col in required_columns:
-            if col not in df_input_serials.columns:
-                print(f"\nERROR: The Excel input file must contain a column named '{col}'.")
-                print("Please check the column headers in your Excel file or update the COLUMN_NAME variables in the script.")
-                exit()
+        pairs = driver.execute_script(extract_info_items_script, info_section_element)
+        if pairs:
+            return {label: value for label, value in pairs}
+        log.debug("    - Single-call extraction returned no items. Falling back to per-element scraping.")
+    except WebDriverException as e:
+        log.warning(f"    - Single-call extraction failed ({type(e).__name__}). Falling back to per-element scraping.")
+    return extract_info_items_per_element(info_section_element)
 
-        all_serials_data = df_input_serials[[serial_number_column_name, product_number_column_name, input_device_name_column_name]].astype(str).values.tolist()
 
-    except Exception as e:
-        print(f"\nERROR: Could not read the Excel file '{serial_number_file}'.")
-        print(f"DETAILS: {e}")
-        print("Please ensure the file is a valid Excel file and not open in another program.")
-        exit()
+def extract_info_items_per_element(info_section_element):
+    info_values = {}
+    info_items = info_section_element.find_elements(By.CSS_SELECTOR, "div.info-item")
 
-    if not all_serials_data:
-        print(f"The input columns in '{serial_number_file}' are empty. No serial numbers to check.")
-        exit()
+    for item in info_items:
+        try:
+            label_elem = item.find_element(By.CSS_SELECTOR, "div.label")
+            text_elem = item.find_element(By.CSS_SELECTOR, "div.text")
+            label = label_elem.text.strip()
 
-    # Filter out already processed serial numbers for resuming
-    serials_to_process = []
-    for sn, pn, device_name in all_serials_data:
-        if sn not in processed_serials:
-            serials_to_process.append((sn, pn, device_name))
+            p_tags = text_elem.find_elements(By.TAG_NAME, "p")
+            if p_tags:
+                value = "\n".join([p.text.strip() for p in p_tags if p.text.strip()])
+            else:
+                value = text_elem.text.strip()
 
-    if not serials_to_process:
-        print("All serial numbers already processed or no new serial numbers to check. Exiting.")
-        if driver:
-            driver.quit()
-        exit()
+            info_values[label] = value
+        except NoSuchElementException:
+            continue
+        except Exception as item_e:
+            log.warning(f"    - Error parsing info-item: {item_e}")
+    log.debug(f"    - Scraped {len(info_values)} of {len(info_items)} info item(s) element by element.")
+    return info_values
 
-    print(f"Found {len(all_serials_data)} total serial number(s) in input file.")
-    print(f"Will process {len(serials_to_process)} new/remaining serial number(s).")
 
+# --- Page Waits (MutationObserver, adaptive timeouts, negative signals) ---
+class SerialNotFoundError(Exception):
+    pass
 
-    driver = setup_driver()
-    if driver is None:
-        exit()
 
-    # Define a default wait for general page interactions
-    wait = WebDriverWait(driver, 60)
+class AdaptiveWaits:
+    # Keeps the recent time-to-ready of every wait stage and derives its timeout from them.
+    # Stages that depend on how the page was opened are learned per lookup mode, so fast
+    # in-place samples do not set the timeout for full page loads.
+    def __init__(self, history_size=50):
+        self.lock = threading.Lock()
+        self.history_size = history_size
+        self.samples = {}
 
-    total_serials_overall = len(all_serials_data)
-    start_index_overall = total_serials_overall - len(serials_to_process)
+    @staticmethod
+    def key(stage, mode=None):
+        return f"{stage}/{mode}" if mode else stage
 
-    # Define the width of the progress bar
-    overall_bar_length = 50
-    scraping_bar_length = 20 # New constant for the inner bar
+    def timeout(self, stage, mode=None):
+        max_seconds = wait_stage_max_seconds.get(stage, 60)
+        with self.lock:
+            samples = sorted(self.samples.get(self.key(stage, mode), []))
+        if len(samples) < wait_min_samples:
+            return max_seconds
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        learned = p95 * wait_learned_multiplier + wait_learned_margin_seconds
+        return max(wait_min_seconds, min(max_seconds, learned))
 
-    for idx_in_subset, (sn, pn_from_excel, device_name_from_input) in enumerate(serials_to_process):
-        current_overall_index = start_index_overall + idx_in_subset + 1
-        overall_progress_percentage = (current_overall_index / total_serials_overall) * 100
+    def observe(self, stage, seconds, mode=None):
+        with self.lock:
+            samples = self.samples.setdefault(self.key(stage, mode), [])
+            samples.append(seconds)
+            del samples[:-self.history_size]
 
-        # Calculate the number of filled characters for the overall bar
-        filled_length_overall = int(overall_bar_length * overall_progress_percentage // 100)
-        overall_bar = '█' * filled_length_overall + '-' * (overall_bar_length - filled_length_overall)
+    def timed_out(self, stage, seconds, mode=None):
+        # A learned timeout that was too short: forget the old samples so the stage waits its
+        # full maximum again until it has relearned how long the site takes now.
+        if seconds >= wait_stage_max_seconds.get(stage, 60):
+            return
+        with self.lock:
+            self.samples[self.key(stage, mode)] = [seconds]
 
-        # Print the overall progress bar line
-        print(f"\n--- [{overall_bar}] {overall_progress_percentage:.1f}% ({current_overall_index}/{total_serials_overall}) - Serial Number: {sn} ---")
+    def load(self, profile_path):
+        if not os.path.exists(profile_path):
+            return
+        try:
+            with open(profile_path, "r", encoding="utf-8") as profile_file:
+                stored = json.load(profile_file)
+            with self.lock:
+                self.samples = {stage: [float(value) for value in values][-self.history_size:] for stage, values in stored.items()}
+            log.info(f"Loaded learned wait timings from '{profile_path}'.")
+        except (OSError, ValueError) as e:
+            log.warning(f"Warning: Could not read '{profile_path}': {e}")
 
-        current_serial_result_dict = {
-            output_new_device_name_header: device_name_from_input,
-            "Serial Number": sn,
-            output_new_status_header: "Processing Error",
-            output_new_start_date_header: "N/A",
-            output_new_end_date_header: "N/A",
-            "Product Number Used": "N/A"
+    def save(self, profile_path):
+        with self.lock:
+            samples = {stage: [round(value, 3) for value in values] for stage, values in self.samples.items()}
+        try:
+            with open(profile_path, "w", encoding="utf-8") as profile_file:
+                json.dump(samples, profile_file)
+        except OSError as e:
+            log.warning(f"Warning: Could not save learned wait timings to '{profile_path}': {e}")
+
+
+adaptive_waits = AdaptiveWaits()
+
+# check() returns the first wanted state that is ready ([name, css, mustBeInteractable,
+# optional text pattern]), a negative state when a matching error message is visible, or null.
+page_state_check_js = """
+var wanted = arguments[0];
+var negativeSelector = arguments[1];
+var negativePatterns = arguments[2].map(function (pattern) { return new RegExp(pattern, 'i'); });
+function isVisible(el) {
+    if (!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)) { return false; }
+    var style = window.getComputedStyle(el);
+    return style.visibility !== 'hidden' && style.display !== 'none';
+}
+function check() {
+    for (var i = 0; i < wanted.length; i++) {
+        var els = document.querySelectorAll(wanted[i][1]);
+        var textPattern = wanted[i][3] ? new RegExp(wanted[i][3]) : null;
+        for (var j = 0; j < els.length; j++) {
+            if (textPattern && !textPattern.test(els[j].innerText || els[j].textContent || '')) { continue; }
+            if (isVisible(els[j]) && (!wanted[i][2] || !els[j].disabled)) {
+                return {state: wanted[i][0], element: els[j]};
+            }
         }
+    }
+    if (negativeSelector) {
+        var errors = document.querySelectorAll(negativeSelector);
+        for (var k = 0; k < errors.length; k++) {
+            var text = (errors[k].innerText || '').trim();
+            if (text && isVisible(errors[k]) && negativePatterns.some(function (re) { return re.test(text); })) {
+                return {state: 'negative', message: text};
+            }
+        }
+    }
+    return null;
+}
+"""
+
+page_state_poll_js = page_state_check_js + "return check();"
+
+page_state_observe_js = page_state_check_js + """
+var timeoutMs = arguments[3];
+var done = arguments[arguments.length - 1];
+var finished = false;
+var observer, timer, poller;
+function finish(result) {
+    if (finished) { return; }
+    finished = true;
+    observer.disconnect();
+    clearTimeout(timer);
+    clearInterval(poller);
+    done(result);
+}
+var initial = check();
+if (initial) { done(initial); return; }
+observer = new MutationObserver(function () { var result = check(); if (result) { finish(result); } });
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+// Visibility can also change through layout alone, which no mutation reports.
+poller = setInterval(function () { var result = check(); if (result) { finish(result); } }, 250);
+timer = setTimeout(function () { finish({state: 'timeout'}); }, timeoutMs);
+"""
+
 
+def wait_for_page_state(driver, stage, wanted_states, detect_negative=False, mode=None):
+    # wanted_states: [(state_name, css_selector, must_be_interactable[, text_pattern]), ...]
+    # Returns (state_name, element). Raises TimeoutException, or SerialNotFoundError when
+    # the page shows a "not found" style message first.
+    timeout = adaptive_waits.timeout(stage, mode)
+    wanted = [list(state) for state in wanted_states]
+    negative_selector = negative_signal_selector if detect_negative else ""
+    started = time.perf_counter()
+    try:
+        result = driver.execute_async_script(page_state_observe_js, wanted, negative_selector, negative_signal_patterns, int(timeout * 1000))
+    except TimeoutException:
+        result = {"state": "timeout"}
+    except WebDriverException as e:
+        # e.g. the document was replaced mid-wait; short polling copes with navigations.
+        remaining = max(0.5, timeout - (time.perf_counter() - started))
+        log.debug(f"    - Observer wait for '{stage}' interrupted ({type(e).__name__}). Polling for {remaining:.0f}s.")
         try:
-            driver.get(website_url)
-            # Removed time.sleep(3) here. WebDriverWait below will wait for the input box.
+            result = WebDriverWait(driver, remaining, poll_frequency=wait_poll_seconds).until(
+                lambda d: d.execute_script(page_state_poll_js, wanted, negative_selector, negative_signal_patterns)
+            )
+        except TimeoutException:
+            result = {"state": "timeout"}
 
-            cookie_handled = handle_cookie_consent(driver)
-            if not cookie_handled:
-                print("    - Warning: Cookie banner could not be handled. This might affect subsequent steps.")
-            # Removed time.sleep(2) here. The next wait will handle the page state after cookie interaction.
+    state = (result or {}).get("state")
+    if state == "timeout" or not state:
+        adaptive_waits.timed_out(stage, timeout, mode)
+        raise TimeoutException(f"Timed out after {timeout:.0f}s waiting for '{stage}'.")
+    # A "not found" message is the page answering too, so it counts as time-to-ready.
+    adaptive_waits.observe(stage, time.perf_counter() - started, mode)
+    if state == "negative":
+        raise SerialNotFoundError(result.get("message", ""))
+    return state, result.get("element")
 
-            input_box = wait.until(EC.element_to_be_clickable((By.ID, "inputtextpfinder")))
-            input_box.clear()
-            input_box.send_keys(sn)
-            print(f"    - Entered serial number: {sn}")
-            # Removed time.sleep(1) here. The click action below will trigger a page load/update.
 
-            submit_btn = wait.until(EC.element_to_be_clickable((By.ID, "FindMyProduct")))
-            driver.execute_script("arguments[0].click();", submit_btn)
-            print("    - Submitted serial number. Checking for product number prompt or direct results...")
+def wait_for_element(driver, stage, css_selector, must_be_interactable=True, detect_negative=False, mode=None):
+    return wait_for_page_state(driver, stage, [(stage, css_selector, must_be_interactable)], detect_negative, mode)[1]
 
-            try:
-                # Use a specific wait for either the product number input or the info section
-                element_found = WebDriverWait(driver, 30).until(
-                    EC.any_of(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, "input[formcontrolname='productNumber']")),
-                        EC.visibility_of_element_located((By.CSS_SELECTOR, "div.info-section"))
-                    ),
-                    message="Timed out waiting for either product number prompt or info section after SN submission."
-                )
-
-                if element_found and element_found.get_attribute('formcontrolname') == "productNumber":
-                    print("    - 'Product number' input field detected. Prompt is present.")
-                    pn_input_box = element_found
-
-                    if not pn_from_excel or pn_from_excel.lower() == 'nan':
-                        print(f"    - Warning: Product/Model number for '{sn}' is empty/NaN in Excel. Cannot fill prompt.")
-                    else:
-                        pn_input_box.clear()
-                        pn_input_box.send_keys(pn_from_excel)
-                        print(f"    - Entered product number: {pn_from_excel}")
-                        current_serial_result_dict["Product Number Used"] = pn_from_excel
 
-                        submit_pn_btn = wait.until(EC.element_to_be_clickable((By.ID, "FindMyProductNumber")))
-                        driver.execute_script("arguments[0].click();", submit_pn_btn)
-                        print("    - Re-submitted with product number.")
+# --- Function to Look Up a Single Serial Number ---
+def lookup_warranty(driver, sn, pn_from_excel, device_name_from_input, session_state=None):
+    current_serial_result_dict = {
+        output_new_device_name_header: device_name_from_input,
+        "Serial Number": sn,
+        output_new_status_header: "Processing Error",
+        output_new_start_date_header: "N/A",
+        output_new_end_date_header: "N/A",
+        "Product Number Used": "N/A"
+    }
 
-                        # Wait for the info section after product number submission
-                        wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "div.info-section")))
-                        print("    - Final info section found after product number submission.")
+    lookup_started = time.perf_counter()
+    lookup_mode = "navigate"
+    try:
+        lookup_mode = open_lookup_form(driver, session_state)
 
-                elif element_found and "info-section" in element_found.get_attribute('class'):
-                    print("    - 'Product number' prompt not detected. Direct results page loaded.")
+        stage_started = time.perf_counter()
+        input_box = wait_for_element(driver, "search_form", "#inputtextpfinder", mode=lookup_mode)
+        input_box.clear()
+        input_box.send_keys(sn)
+        log.debug(f"    - Entered serial number: {sn}")
+        # Removed time.sleep(1) here. The click action below will trigger a page load/update.
 
-            except TimeoutException as e:
-                print(f"    - Timeout: Neither Product Number prompt nor main info section appeared after serial submission: {e.msg}")
-                current_serial_result_dict[output_new_status_header] = "Navigation Timeout"
-                current_serial_result_dict[output_new_end_date_header] = "Error"
-                current_serial_result_dict[output_new_start_date_header] = "Error"
-            except Exception as e:
-                print(f"    - ERROR: An unexpected error occurred during dynamic element detection: {type(e).__name__}: {e}")
-                current_serial_result_dict[output_new_status_header] = "Dynamic Detection Error"
-                current_serial_result_dict[output_new_end_date_header] = "Error"
-                current_serial_result_dict[output_new_start_date_header] = "Error"
+        submit_btn = wait_for_element(driver, "submit_button", "#FindMyProduct", mode=lookup_mode)
+        driver.execute_script("arguments[0].click();", submit_btn)
+        log.debug("    - Submitted serial number. Checking for product number prompt or direct results...")
+        profiler.record("serial_submit", stage_started, sn)
 
-            if current_serial_result_dict[output_new_status_header] == "Processing Error":
-                try:
-                    info_section_element = wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "div.info-section")))
-                    print(f"    - Main info section confirmed for scraping.")
-
-                    warranty_status_scraped = "Not Found"
-                    warranty_end_date_scraped = "Not Found"
-                    warranty_start_date_scraped = "Not Found"
-
-                    try:
-                        info_items = info_section_element.find_elements(By.CSS_SELECTOR, "div.info-item")
-                        total_info_items = len(info_items)
-
-                        for item_idx, item in enumerate(info_items):
-                            scraping_progress_percentage = ((item_idx + 1) / total_info_items) * 100
-                            
-                            # Calculate the number of filled characters for the scraping bar
-                            filled_length_scraping = int(scraping_bar_length * scraping_progress_percentage // 100)
-                            scraping_bar = '█' * filled_length_scraping + '-' * (scraping_bar_length - filled_length_scraping)
-
-                            # Print the scraping progress bar line
-                            print(f"        - Scraping data: [{scraping_bar}] {scraping_progress_percentage:.1f}% ({item_idx+1}/{total_info_items})", end='\r')
-                            
-                            try:
-                                label_elem = item.find_element(By.CSS_SELECTOR, "div.label")
-                                text_elem = item.find_element(By.CSS_SELECTOR, "div.text")
-                                label = label_elem.text.strip()
-
-                                p_tags = text_elem.find_elements(By.TAG_NAME, "p")
-                                if p_tags:
-                                    value = "\n".join([p.text.strip() for p in p_tags if p.text.strip()])
-                                else:
-                                    value = text_elem.text.strip()
-
-                                if label == "End date":
-                                    warranty_end_date_scraped = value
-                                elif label == "Status":
-                                    warranty_status_scraped = value
-                                elif label == "Start date":
-                                    warranty_start_date_scraped = value
-                            except NoSuchElementException:
-                                continue
-                            except Exception as item_e:
-                                print(f"\n    - Error parsing info-item: {item_e}")
-                        print("\n") # Newline after the scraping progress line to clear the '\r' effect
-
-                        print(f"    - Success: Scraped details for '{current_serial_result_dict[output_new_device_name_header]}'.")
-                        print(f"        - Warranty Status: {warranty_status_scraped}")
-                        print(f"        - Warranty Start Date: {warranty_start_date_scraped}")
-                        print(f"        - Warranty End Date: {warranty_end_date_scraped}")
-                        
-                        current_serial_result_dict[output_new_status_header] = warranty_status_scraped
-                        current_serial_result_dict[output_new_end_date_header] = warranty_end_date_scraped
-                        current_serial_result_dict[output_new_start_date_header] = warranty_start_date_scraped
-
-                    except NoSuchElementException as e:
-                        current_serial_result_dict[output_new_status_header] = "Scraping Error"
-                        current_serial_result_dict[output_new_end_date_header] = "Error"
-                        current_serial_result_dict[output_new_start_date_header] = "Error"
-                        print(f"    - Error: Could not parse page for warranty details (info-section content missing): {e}")
-                    except TimeoutException as e:
-                        current_serial_result_dict[output_new_status_header] = "Scraping Timeout"
-                        current_serial_result_dict[output_new_end_date_header] = "Error"
-                        current_serial_result_dict[output_new_start_date_header] = "Error"
-                        print(f"    - ERROR: Timeout during scraping process. Elements not found after result section visibility confirmed: {e}")
-                    except Exception as e:
-                        current_serial_result_dict[output_new_status_header] = "Unhandled Scraping Error"
-                        current_serial_result_dict[output_new_end_date_header] = "Error"
-                        current_serial_result_dict[output_new_start_date_header] = "Error"
-                        print(f"    - UNEXPECTED ERROR during scraping: {e}")
-                except TimeoutException:
-                    print(f"    - ERROR: A timeout occurred waiting for info section for SN {sn}. Page content not ready.")
-                    current_serial_result_dict[output_new_status_header] = "Info Section Timeout"
-                    current_serial_result_dict[output_new_end_date_header] = "Error"
-                    current_serial_result_dict[output_new_start_date_header] = "Error"
-                except Exception as e:
-                    print(f"    - UNEXPECTED ERROR getting info section for SN {sn}: {e}")
-                    current_serial_result_dict[output_new_status_header] = "Info Section Error"
+        stage_started = time.perf_counter()
+        try:
+            # Wait for either the product number input or the info section (or a "not found" message)
+            state_found, element_found = wait_for_page_state(driver, "prompt_or_result", [
+                ("product_prompt", "input[formcontrolname='productNumber']", True),
+                ("info_section", info_section_selector, False),
+            ], detect_negative=True)
+
+            if state_found == "product_prompt":
+                log.debug("    - 'Product number' input field detected. Prompt is present.")
+                pn_input_box = element_found
+                if session_state is not None:
+                    session_state["reload_next"] = True
+
+                if not has_product_number(pn_from_excel):
+                    log.warning(f"    - Warning: Product/Model number for '{sn}' is empty/NaN in Excel. Cannot fill prompt.")
+                    # Nothing to wait for; retrying would only hit the same prompt again.
+                    current_serial_result_dict[output_new_status_header] = "Product Number Required"
                     current_serial_result_dict[output_new_end_date_header] = "Error"
                     current_serial_result_dict[output_new_start_date_header] = "Error"
+                else:
+                    pn_input_box.clear()
+                    pn_input_box.send_keys(pn_from_excel)
+                    log.debug(f"    - Entered product number: {pn_from_excel}")
+                    current_serial_result_dict["Product Number Used"] = pn_from_excel
 
-        except TimeoutException:
-            print(f"    - ERROR: A timeout occurred for SN {sn}. The page may have failed to load or a specific element was not found in time.")
-            current_serial_result_dict[output_new_status_header] = "Global Timeout"
+                    submit_pn_btn = wait_for_element(driver, "submit_button", "#FindMyProductNumber")
+                    driver.execute_script("arguments[0].click();", submit_pn_btn)
+                    log.debug("    - Re-submitted with product number.")
+
+                    # Wait for the info section after product number submission
+                    wait_for_element(driver, "result_after_prompt", info_section_selector, must_be_interactable=False, detect_negative=True)
+                    log.debug("    - Final info section found after product number submission.")
+
+            elif state_found == "info_section":
+                log.debug("    - 'Product number' prompt not detected. Direct results page loaded.")
+
+        except SerialNotFoundError as e:
+            log.warning(f"    - HP reported the serial number as not found: {e}")
+            current_serial_result_dict[output_new_status_header] = "Serial Not Found"
             current_serial_result_dict[output_new_end_date_header] = "Error"
             current_serial_result_dict[output_new_start_date_header] = "Error"
-        except WebDriverException as e:
-            print(f"    - CRITICAL ERROR: WebDriver error encountered for SN {sn}: {e}")
-            print("    - The WebDriver session may have been lost. Attempting to re-establish the driver.")
-            current_serial_result_dict[output_new_status_header] = "WebDriver Session Lost"
+            if session_state is not None:
+                session_state["reload_next"] = True
+        except TimeoutException as e:
+            log.warning(f"    - Timeout: Neither Product Number prompt nor main info section appeared after serial submission: {e.msg}")
+            current_serial_result_dict[output_new_status_header] = "Navigation Timeout"
             current_serial_result_dict[output_new_end_date_header] = "Error"
             current_serial_result_dict[output_new_start_date_header] = "Error"
-            if driver:
-                driver.quit()
-            driver = setup_driver()
-            if driver is None:
-                print("    - Failed to re-establish WebDriver. Exiting script.")
-                break
-            else:
-                wait = WebDriverWait(driver, 60)
-                # Removed time.sleep(5) here. The next iteration will try to navigate.
+            if lookup_mode == "in-place":
+                # The page may have re-used the previous result element; fall back to full reloads.
+                log.warning("    - Disabling in-place form reset for this session after a timeout.")
+                session_state["in_place_reset"] = False
         except Exception as e:
-            print(f"    - UNEXPECTED GLOBAL ERROR for SN {sn}: An unhandled error occurred: {e}")
-            current_serial_result_dict[output_new_status_header] = "Unhandled Script Error"
+            log.warning(f"    - ERROR: An unexpected error occurred during dynamic element detection: {type(e).__name__}: {e}")
+            current_serial_result_dict[output_new_status_header] = "Dynamic Detection Error"
             current_serial_result_dict[output_new_end_date_header] = "Error"
             current_serial_result_dict[output_new_start_date_header] = "Error"
+        profiler.record("product_prompt_wait", stage_started, sn)
+
+        if current_serial_result_dict[output_new_status_header] == "Processing Error":
+            stage_started = time.perf_counter()
+            try:
+                info_section_element = wait_for_element(driver, "info_section", info_section_selector, must_be_interactable=False)
+                log.debug(f"    - Main info section confirmed for scraping.")
+
+                warranty_status_scraped = "Not Found"
+                warranty_end_date_scraped = "Not Found"
+                warranty_start_date_scraped = "Not Found"
+
+                try:
+                    info_values = extract_info_items(driver, info_section_element)
+                    warranty_status_scraped = info_values.get("Status", warranty_status_scraped)
+                    warranty_end_date_scraped = info_values.get("End date", warranty_end_date_scraped)
+                    warranty_start_date_scraped = info_values.get("Start date", warranty_start_date_scraped)
+
+                    log.debug(f"    - Success: Scraped details for '{current_serial_result_dict[output_new_device_name_header]}'.")
+                    log.debug(f"        - Warranty Status: {warranty_status_scraped}")
+                    log.debug(f"        - Warranty Start Date: {warranty_start_date_scraped}")
+                    log.debug(f"        - Warranty End Date: {warranty_end_date_scraped}")
+
+                    current_serial_result_dict[output_new_status_header] = warranty_status_scraped
+                    current_serial_result_dict[output_new_end_date_header] = warranty_end_date_scraped
+                    current_serial_result_dict[output_new_start_date_header] = warranty_start_date_scraped
+
+                except NoSuchElementException as e:
+                    current_serial_result_dict[output_new_status_header] = "Scraping Error"
+                    current_serial_result_dict[output_new_end_date_header] = "Error"
+                    current_serial_result_dict[output_new_start_date_header] = "Error"
+                    log.warning(f"    - Error: Could not parse page for warranty details (info-section content missing): {e}")
+                except TimeoutException as e:
+                    current_serial_result_dict[output_new_status_header] = "Scraping Timeout"
+                    current_serial_result_dict[output_new_end_date_header] = "Error"
+                    current_serial_result_dict[output_new_start_date_header] = "Error"
+                    log.warning(f"    - ERROR: Timeout during scraping process. Elements not found after result section visibility confirmed: {e}")
+                except Exception as e:
+                    current_serial_result_dict[output_new_status_header] = "Unhandled Scraping Error"
+                    current_serial_result_dict[output_new_end_date_header] = "Error"
+                    current_serial_result_dict[output_new_start_date_header] = "Error"
+                    log.warning(f"    - UNEXPECTED ERROR during scraping: {e}")
+            except TimeoutException:
+                log.warning(f"    - ERROR: A timeout occurred waiting for info section for SN {sn}. Page content not ready.")
+                current_serial_result_dict[output_new_status_header] = "Info Section Timeout"
+                current_serial_result_dict[output_new_end_date_header] = "Error"
+                current_serial_result_dict[output_new_start_date_header] = "Error"
+            except Exception as e:
+                log.warning(f"    - UNEXPECTED ERROR getting info section for SN {sn}: {e}")
+                current_serial_result_dict[output_new_status_header] = "Info Section Error"
+                current_serial_result_dict[output_new_end_date_header] = "Error"
+                current_serial_result_dict[output_new_start_date_header] = "Error"
+            profiler.record("info_section_scrape", stage_started, sn)
+
+    except TimeoutException:
+        log.warning(f"    - ERROR: A timeout occurred for SN {sn}. The page may have failed to load or a specific element was not found in time.")
+        current_serial_result_dict[output_new_status_header] = "Global Timeout"
+        current_serial_result_dict[output_new_end_date_header] = "Error"
+        current_serial_result_dict[output_new_start_date_header] = "Error"
+    except WebDriverException:
+        # Session-level failures are handled by the backend that owns the driver.
+        raise
+    except Exception as e:
+        log.warning(f"    - UNEXPECTED GLOBAL ERROR for SN {sn}: An unhandled error occurred: {e}")
+        current_serial_result_dict[output_new_status_header] = "Unhandled Script Error"
+        current_serial_result_dict[output_new_end_date_header] = "Error"
+        current_serial_result_dict[output_new_start_date_header] = "Error"
+
+
+    current_serial_result_dict["Lookup Mode"] = lookup_mode
+    current_serial_result_dict["Lookup Seconds"] = round(profiler.record("lookup_selenium", lookup_started, sn), 3)
+    return current_serial_result_dict
+
+
+def make_error_result(sn, pn_from_excel, device_name_from_input, status):
+    return {
+        output_new_device_name_header: device_name_from_input,
+        "Serial Number": sn,
+        output_new_status_header: status,
+        output_new_start_date_header: "Error",
+        output_new_end_date_header: "Error",
+        "Product Number Used": "N/A"
+    }
+
+
+def has_product_number(pn_from_excel):
+    pn_from_excel = str(pn_from_excel).strip() if pn_from_excel is not None else ""
+    return bool(pn_from_excel) and pn_from_excel.lower() != 'nan'
+
+
+# --- Lookup Backends ---
+# Every backend offers start() -> bool, lookup(sn, pn, device_name) -> result dict
+# (or None when it cannot resolve the serial), close(), and an `alive` flag that
+# tells the worker whether the backend can take more work.
+class SeleniumLookupBackend:
+    name = "selenium"
+
+    def __init__(self, worker_id=None):
+        self.worker_id = worker_id
+        self.driver = None
+        self.session_state = None
+
+    @property
+    def alive(self):
+        return self.driver is not None
+
+    def start(self):
+        stage_started = time.perf_counter()
+        self.driver = setup_driver()
+        if self.driver is None:
+            return False
+        self.session_state = prepare_session(self.driver)
+        profiler.record("driver_cold_start", stage_started)
+        spare_drivers.ensure_warming()
+        return True
+
+    def restart(self):
+        stage_started = time.perf_counter()
+        spare = spare_drivers.take()
+        if spare is not None:
+            self.driver, self.session_state = spare
+            profiler.record("driver_swap", stage_started)
+            log.info(f"    - [Worker {self.worker_id}] Swapped in a pre-warmed browser.")
+            return True
+        return self.start()
+
+    def lookup(self, sn, pn_from_excel, device_name_from_input):
+        if self.driver is None and not self.start():
+            return make_error_result(sn, pn_from_excel, device_name_from_input, "WebDriver Session Lost")
+
+        try:
+            return lookup_warranty(self.driver, sn, pn_from_excel, device_name_from_input, self.session_state)
+        except WebDriverException as e:
+            log.error(f"    - CRITICAL ERROR: WebDriver error encountered for SN {sn}: {e}")
+            log.warning(f"    - [Worker {self.worker_id}] The WebDriver session may have been lost. Attempting to re-establish the driver.")
+            result = make_error_result(sn, pn_from_excel, device_name_from_input, "WebDriver Session Lost")
+            # Only this worker's session is restarted; the other workers keep going.
+            self.close()
+            if not self.restart():
+                log.error(f"    - [Worker {self.worker_id}] Failed to re-establish WebDriver.")
+            return result
+
+    def close(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+        self.driver = None
+
+
+class HttpLookupBackend:
+    name = "http"
+    alive = True
+
+    def __init__(self, base_url=None, timeout=None):
+        self.base_url = (base_url or http_api_base_url).rstrip("/")
+        self.timeout = timeout or http_timeout_seconds
+        self.session = None
+        # Country/language come from the public page URL, e.g. /us-en/check-warranty.
+        locale = website_url.rstrip("/").split("/")[-2]
+        self.country_code, _, self.language_code = locale.partition("-")
+
+    def start(self):
+        # One pooled keep-alive session per worker.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=http_pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": browser_user_agent,
+            "Accept": "application/json",
+            "Referer": website_url,
+        })
+        return True
+
+    def build_request_payload(self, sn, pn_from_excel):
+        product_number = pn_from_excel if has_product_number(pn_from_excel) else ""
+        return {
+            "cc": self.country_code,
+            "lc": self.language_code,
+            "utcOffset": "M0000",
+            "customerId": "",
+            "deviceList": [{
+                "serialNumber": sn,
+                "productNumber": product_number,
+                "displayProductNumber": product_number,
+                "countryOfPurchase": self.country_code,
+            }],
+        }
+
+    def build_request(self, sn, pn_from_excel):
+        return {
+            "url": self.base_url + http_warranty_endpoint,
+            "params": {"cache": "true", "authState": "anonymous", "template": "checkWarranty"},
+            "json": self.build_request_payload(sn, pn_from_excel),
+            "timeout": self.timeout,
+        }
+
+    def lookup(self, sn, pn_from_excel, device_name_from_input):
+        if self.session is None:
+            self.start()
+        lookup_started = time.perf_counter()
+        try:
+            response = self.session.post(**self.build_request(sn, pn_from_excel))
+            response.raise_for_status()
+            warranty = parse_http_warranty_response(response.json(), sn)
+        except (requests.RequestException, ValueError) as e:
+            log.warning(f"    - HTTP lookup failed for SN {sn}: {type(e).__name__}: {e}")
+            profiler.record("http_request", lookup_started, sn)
+            return make_error_result(sn, pn_from_excel, device_name_from_input, http_error_status(e))
+        profiler.record("http_request", lookup_started, sn)
+        return self.build_result(sn, pn_from_excel, device_name_from_input, warranty, lookup_started)
+
+    def build_result(self, sn, pn_from_excel, device_name_from_input, warranty, lookup_started):
+        if warranty is None:
+            log.debug(f"    - HTTP backend could not resolve SN {sn}.")
+            return None
+
+        log.debug(f"    - Success (HTTP): {sn} -> {warranty['status']}")
+        return {
+            output_new_device_name_header: device_name_from_input,
+            "Serial Number": sn,
+            output_new_status_header: warranty["status"],
+            output_new_start_date_header: warranty["start_date"],
+            output_new_end_date_header: warranty["end_date"],
+            "Product Number Used": pn_from_excel if has_product_number(pn_from_excel) else "N/A",
+            "Lookup Mode": "http",
+            "Lookup Seconds": round(time.perf_counter() - lookup_started, 3),
+        }
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+        self.session = None
+
+
+class AsyncHttpLookupBackend(HttpLookupBackend):
+    # Same request/response handling as HttpLookupBackend, on an httpx.AsyncClient
+    # shared by every lookup in the event loop.
+    name = "async-http"
+
+    def start(self):
+        self.session = httpx.AsyncClient(
+            headers={"User-Agent": browser_user_agent, "Accept": "application/json", "Referer": website_url},
+            limits=httpx.Limits(max_connections=async_max_concurrency, max_keepalive_connections=async_max_concurrency),
+        )
+        return True
+
+    async def lookup_async(self, sn, pn_from_excel, device_name_from_input):
+        if self.session is None:
+            self.start()
+        lookup_started = time.perf_counter()
+        try:
+            response = await self.session.post(**self.build_request(sn, pn_from_excel))
+            response.raise_for_status()
+            warranty = parse_http_warranty_response(response.json(), sn)
+        except (httpx.HTTPError, ValueError) as e:
+            log.warning(f"    - HTTP lookup failed for SN {sn}: {type(e).__name__}: {e}")
+            profiler.record("http_request", lookup_started, sn)
+            return make_error_result(sn, pn_from_excel, device_name_from_input, http_error_status(e))
+        profiler.record("http_request", lookup_started, sn)
+        return self.build_result(sn, pn_from_excel, device_name_from_input, warranty, lookup_started)
+
+    async def aclose(self):
+        if self.session is not None:
+            await self.session.aclose()
+        self.session = None
+
+
+def http_error_status(error):
+    # "HTTP Error" (transient) for connection problems, timeouts, 5xx, 408 and 429; any other
+    # 4xx means the request itself is wrong and retrying it will not help.
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is None or status_code >= 500 or status_code in (408, 429):
+        return "HTTP Error"
+    return "HTTP Client Error"
+
+
+def http_lookup_unresolved(result):
+    # None: the serial needs the page (e.g. the product number prompt); HTTP errors: the request failed.
+    return result is None or result[output_new_status_header] in ("HTTP Error", "HTTP Client Error")
+
+
+def parse_http_warranty_response(payload, sn):
+    devices = ((payload or {}).get("data") or {}).get("devices") or []
+    for device in devices:
+        if str(device.get("serialNumber", "")).strip().upper() != sn.strip().upper():
+            continue
+        # The page shows the product number prompt in this case; leave it to Selenium.
+        if device.get("productNumberRequired"):
+            return None
+        warranty = device.get("warranty") or {}
+        if not warranty.get("status"):
+            return None
+        return {
+            "status": warranty["status"],
+            "start_date": warranty.get("startDate") or "Not Found",
+            "end_date": warranty.get("endDate") or "Not Found",
+        }
+    return None
+
+
+class FallbackLookupBackend:
+    # Tries the primary backend first; serials it cannot resolve go to the fallback,
+    # which is only started the first time it is needed.
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+        self.fallback_started = False
+
+    @property
+    def alive(self):
+        return self.primary.alive
+
+    def start(self):
+        return self.primary.start()
+
+    def lookup(self, sn, pn_from_excel, device_name_from_input):
+        result = self.primary.lookup(sn, pn_from_excel, device_name_from_input)
+        if not http_lookup_unresolved(result):
+            return result
+
+        log.debug(f"    - Falling back to {self.fallback.name} for SN {sn}.")
+        if not self.fallback_started:
+            self.fallback_started = True
+            if not self.fallback.start():
+                log.warning(f"    - Warning: {self.fallback.name} fallback could not be started.")
+        result = self.fallback.lookup(sn, pn_from_excel, device_name_from_input)
+        if result is None:
+            result = make_error_result(sn, pn_from_excel, device_name_from_input, "Lookup Failed")
+        return result
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+def create_lookup_backend(worker_id=None, backend_name=None):
+    backend_name = backend_name or lookup_backend
+    if backend_name == "selenium":
+        return SeleniumLookupBackend(worker_id)
+    if backend_name == "http":
+        return HttpLookupBackend()
+    if backend_name == "http+selenium":
+        return FallbackLookupBackend(HttpLookupBackend(), SeleniumLookupBackend(worker_id))
+    raise ValueError(f"Unknown lookup backend '{backend_name}'. Use 'selenium', 'http' or 'http+selenium'.")
+
+
+# --- Worker Thread: one lookup backend pulling from the shared work queue ---
+def warranty_worker(worker_id, work_queue, result_queue, scheduler):
+    backend = None
+    try:
+        backend = create_lookup_backend(worker_id)
+        try:
+            started = backend.start()
+        except Exception as e:
+            log.error(f"[Worker {worker_id}] Error while starting the {backend.name} backend: {type(e).__name__}: {e}")
+            started = False
+        if not started:
+            log.error(f"[Worker {worker_id}] Could not start the {backend.name} backend. Worker exiting.")
+            return
+
+        while True:
+            work_item = work_queue.get()
+            if work_item is None:
+                break
+
+            sn, pn_from_excel, device_name_from_input = work_item
+            log.debug(f"[Worker {worker_id}] --- Looking up Serial Number: {sn} ---")
+
+            # Waits here while the retry scheduler has cut concurrency back.
+            scheduler.acquire_slot()
+            try:
+                result = backend.lookup(sn, pn_from_excel, device_name_from_input)
+            except Exception as e:
+                log.warning(f"    - UNEXPECTED GLOBAL ERROR for SN {sn}: An unhandled error occurred: {e}")
+                result = make_error_result(sn, pn_from_excel, device_name_from_input, "Unhandled Script Error")
+            finally:
+                scheduler.release_slot()
+            if result is None:
+                result = make_error_result(sn, pn_from_excel, device_name_from_input, "Lookup Failed")
+            result_queue.put(("lookup", work_item, result))
+
+            if not backend.alive:
+                log.warning(f"[Worker {worker_id}] The {backend.name} backend is no longer available. Worker exiting.")
+                break
+    finally:
+        # The sentinel is posted whatever happened above, or the main thread would wait forever.
+        try:
+            if backend is not None:
+                backend.close()
+        finally:
+            result_queue.put(None)
+
+
+# --- Input Reading (streaming, deduplicated) ---
+def iter_input_table(input_path):
+    # Yields the header row first, then every data row, without loading the whole file.
+    extension = os.path.splitext(input_path)[1].lower()
+    if extension == ".csv":
+        with open(input_path, "r", encoding="utf-8-sig", newline="") as input_file:
+            yield from csv.reader(input_file)
+    elif extension == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Reading Parquet input requires the 'pyarrow' package.")
+        parquet_file = pq.ParquetFile(input_path)
+        yield tuple(parquet_file.schema_arrow.names)
+        for batch in parquet_file.iter_batches(batch_size=5000):
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+    else:
+        workbook = load_workbook(input_path, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+
+def normalize_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return ""
+        if value.is_integer():
+            # Numeric serials/model numbers read back from Excel as 12345.0
+            value = int(value)
+    value = str(value).strip()
+    return "" if value.lower() == "nan" else value
+
+
+def normalize_serial(sn):
+    return normalize_cell(sn).upper()
+
+
+def open_input_rows(input_path):
+    # Validates the header up front so a bad file fails before any lookups start.
+    table = iter_input_table(input_path)
+    header = [normalize_cell(cell) for cell in (next(table, None) or [])]
+    required_columns = [serial_number_column_name, product_number_column_name, input_device_name_column_name]
+    for col in required_columns:
+        if col not in header:
+            raise KeyError(col)
+    column_indexes = [header.index(col) for col in required_columns]
+
+    def rows():
+        for row in table:
+            row = list(row) + [None] * (len(header) - len(row))
+            sn, pn, device_name = (row[index] for index in column_indexes)
+            sn = normalize_serial(sn)
+            if sn:
+                yield sn, normalize_cell(pn), normalize_cell(device_name)
+    return rows()
+
+
+# Fields a late duplicate row copies from its serial's result. Only these are kept per serial
+# for the rest of the run; timings and the lookup mode stay with the rows written first.
+late_row_fields = ("Serial Number", output_new_status_header, output_new_start_date_header,
+                   output_new_end_date_header, "Product Number Used", "Fetched At")
+
+
+class SerialWorkStream:
+    # Turns the input rows into a lazy stream of (work_item, cached_result) pairs:
+    # one entry per unique serial that still needs a result in this run. Duplicate
+    # rows are remembered and fanned back out to every device name at output time.
+    # journaled_rows holds the (device name, serial) pairs the journal already has a row for.
+    def __init__(self, input_rows, processed_results=None, cache=None, journaled_rows=None):
+        self.input_rows = input_rows
+        self.processed_results = processed_results or {}
+        self.cache = cache
+        self.journaled_rows = journaled_rows or set()
+        self.lock = threading.Lock()
+        self.device_names = {}
+        self.results = {}  # serial -> values of late_row_fields
+        self.late_rows = []
+        self.rows_read = 0
+        self.skipped = 0
+        self.unique_to_process = 0
+        self.finished = False
+
+    def __iter__(self):
+        for sn, pn_from_excel, device_name_from_input in self.input_rows:
+            with self.lock:
+                self.rows_read += 1
+                known_names = self.device_names.get(sn)
+                if known_names is not None:
+                    if device_name_from_input not in known_names:
+                        known_names.append(device_name_from_input)
+                        # The serial's result was already written; add a row for this device too.
+                        if sn in self.results:
+                            self.add_late_row(dict(zip(late_row_fields, self.results[sn])), device_name_from_input)
+                        elif sn in self.processed_results:
+                            self.add_resumed_row(sn, device_name_from_input)
+                    continue
+                self.device_names[sn] = [device_name_from_input]
+                if sn in self.processed_results:
+                    self.skipped += 1
+                    self.add_resumed_row(sn, device_name_from_input)
+                    continue
+                self.unique_to_process += 1
+
+            cached_result = None
+            if self.cache is not None:
+                stage_started = time.perf_counter()
+                cached = self.cache.get(sn, pn_from_excel)
+                profiler.record("cache_lookup", stage_started, sn)
+                if cached is not None:
+                    cached_result = {output_new_device_name_header: device_name_from_input, "Serial Number": sn, "Lookup Mode": "cache"}
+                    cached_result.update(cached)
+            yield (sn, pn_from_excel, device_name_from_input), cached_result
+
+        with self.lock:
+            self.finished = True
+        log.info(f"Finished reading input: {self.rows_read} row(s), {len(self.device_names)} unique serial number(s), "
+                 f"{self.skipped} already processed, {self.unique_to_process} to process.")
+
+    def add_late_row(self, result, device_name_from_input):
+        # Called with the lock held.
+        self.late_rows.append(dict(result, **{output_new_device_name_header: device_name_from_input}))
+
+    def add_resumed_row(self, sn, device_name_from_input):
+        # Resumed serial listed under a device the journal has no row for yet.
+        if (device_name_from_input, sn) not in self.journaled_rows:
+            self.add_late_row(self.processed_results[sn], device_name_from_input)
+
+    def fan_out(self, result):
+        sn = result["Serial Number"]
+        with self.lock:
+            self.results[sn] = tuple(result.get(field) for field in late_row_fields)
+            device_names = list(self.device_names.get(sn) or [result[output_new_device_name_header]])
+        return [dict(result, **{output_new_device_name_header: device_name}) for device_name in device_names]
+
+    def drain_late_rows(self):
+        with self.lock:
+            late_rows, self.late_rows = self.late_rows, []
+        return late_rows
+
+    def progress_total(self):
+        with self.lock:
+            return self.unique_to_process, self.finished
+
+
+# --- Retry Scheduler (failure triage, retry budget, throttling guard) ---
+def retry_delay_seconds(attempt):
+    # Exponential backoff with jitter: base, 2*base, 4*base, ... capped at retry_max_delay_seconds.
+    delay = min(retry_max_delay_seconds, retry_base_delay_seconds * (2 ** (attempt - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class RetryScheduler:
+    # Shared by the lookups of one engine run. Decides whether a failed lookup is tried again
+    # and how many lookups may run at once (cut in half when transient failures spike, which
+    # usually means the site is throttling us, then raised again one slot at a time).
+    def __init__(self, max_concurrency):
+        self.condition = threading.Condition()
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency_limit = self.max_concurrency
+        self.active = 0
+        self.recent_failures = collections.deque(maxlen=failure_window_size)
+        self.successes_in_a_row = 0
+        self.first_attempts = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    def acquire_slot(self):
+        with self.condition:
+            while self.active >= self.concurrency_limit:
+                self.condition.wait()
+            self.active += 1
+
+    def try_acquire_slot(self):
+        with self.condition:
+            if self.active >= self.concurrency_limit:
+                return False
+            self.active += 1
+            return True
+
+    def release_slot(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def retry_delay(self, result, attempt):
+        # Backoff before the next attempt, or None when the result is final.
+        transient = result[output_new_status_header] in transient_statuses
+        with self.condition:
+            if attempt == 1:
+                self.first_attempts += 1
+            self.track_failure_rate(transient)
+            if not transient:
+                return None
+            if attempt >= retry_max_attempts or self.retries >= retry_budget_min + retry_budget_ratio * self.first_attempts:
+                self.exhausted += 1
+                return None
+            self.retries += 1
+        return retry_delay_seconds(attempt)
+
+    def track_failure_rate(self, failed):
+        # Called with the condition held.
+        self.recent_failures.append(failed)
+        if not failed:
+            self.successes_in_a_row += 1
+            if self.concurrency_limit < self.max_concurrency and self.successes_in_a_row >= concurrency_recovery_successes:
+                self.concurrency_limit += 1
+                self.successes_in_a_row = 0
+                self.condition.notify_all()
+                log.info(f"    - Failure rate back to normal. Concurrency raised to {self.concurrency_limit}/{self.max_concurrency}.")
+            return
+
+        self.successes_in_a_row = 0
+        samples = len(self.recent_failures)
+        if (self.concurrency_limit > 1 and samples >= failure_window_size // 2
+                and sum(self.recent_failures) / samples >= failure_spike_rate):
+            self.concurrency_limit = max(1, self.concurrency_limit // 2)
+            # Start a fresh window so the next cut is based on lookups made at the new limit.
+            self.recent_failures.clear()
+            log.warning(f"WARNING: Transient failures spiked (possible throttling). Concurrency reduced to {self.concurrency_limit}/{self.max_concurrency}.")
+
+    def print_summary(self):
+        if self.retries or self.exhausted:
+            log.info(f"Retries: {self.retries} transient failure(s) re-queued, {self.exhausted} recorded after running out of retries.")
+        if self.concurrency_limit < self.max_concurrency:
+            log.info(f"Concurrency ended at {self.concurrency_limit}/{self.max_concurrency} after throttling was detected.")
+
+
+# --- Thread Engine ---
+def feed_work_queue(work_stream, work_queue, result_queue, stop_event):
+    # Reads the input lazily so lookups start before the whole file is parsed.
+    # stop_event is set when no worker is left to take the work.
+    lookups_fed = 0
+    input_complete = False
+    try:
+        for work_item, cached_result in work_stream:
+            if stop_event.is_set():
+                break
+            if cached_result is not None:
+                result_queue.put(("cached", None, cached_result))
+                continue
+            # Keep the queue short so a huge input is not all held in memory. (Retries are
+            # added to the same queue by the main thread, which must never block on it.)
+            while work_queue.qsize() >= max(100, num_workers * 20) and not stop_event.wait(0.05):
+                pass
+            if stop_event.is_set():
+                break
+            work_queue.put(work_item)
+            lookups_fed += 1
+        else:
+            input_complete = True
+    except Exception as e:
+        log.error(f"ERROR: Could not read the input file. DETAILS: {e}")
+    finally:
+        result_queue.put(("input_done", lookups_fed, input_complete))
+
+
+def run_thread_engine(work_stream, recorder):
+    work_queue = queue.Queue()
+    result_queue = queue.Queue()
+
+    worker_count = max(1, num_workers)
+    scheduler = RetryScheduler(worker_count)
+    stop_feeding = threading.Event()
+    feeder = threading.Thread(target=feed_work_queue, args=(work_stream, work_queue, result_queue, stop_feeding), daemon=True)
+    feeder.start()
+
+    log.info(f"Starting {worker_count} '{lookup_backend}' worker(s)...")
+    workers = []
+    for worker_id in range(1, worker_count + 1):
+        worker = threading.Thread(target=warranty_worker, args=(worker_id, work_queue, result_queue, scheduler),
+                                  name=f"Worker {worker_id}", daemon=True)
+        worker.start()
+        workers.append(worker)
+
+    # Results are collected on the main thread so resume and output logic stay single-threaded.
+    retry_heap = []
+    retry_order = itertools.count()
+    attempts = {}
+    lookups_fed = None
+    input_complete = False
+    lookups_finished = 0
+    workers_stopped = False
+    active_workers = worker_count
+    while active_workers:
+        # Retries whose backoff is over go to the back of the work queue.
+        while retry_heap and retry_heap[0][0] <= time.monotonic():
+            _, _, attempt, work_item = heapq.heappop(retry_heap)
+            attempts[work_item[0]] = attempt
+            work_queue.put(work_item)
+        if not workers_stopped and lookups_fed is not None and lookups_finished >= lookups_fed:
+            # One stop sentinel per worker.
+            for _ in range(worker_count):
+                work_queue.put(None)
+            workers_stopped = True
+
+        try:
+            message = result_queue.get(timeout=max(0.0, retry_heap[0][0] - time.monotonic()) if retry_heap else None)
+        except queue.Empty:
+            continue
+        if message is None:
+            active_workers -= 1
+            continue
+        kind, work_item, result = message
+        if kind == "input_done":
+            lookups_fed, input_complete = work_item, result
+            continue
+        if kind == "cached":
+            recorder.record(result)
+            continue
 
-        new_row_df = pd.DataFrame([current_serial_result_dict])
-        if "Product Number Used" not in output_columns_order and "Product Number Used" in new_row_df.columns:
-            new_row_df = new_row_df.drop(columns=["Product Number Used"])
-        new_row_df = new_row_df[output_columns_order]
+        sn = work_item[0]
+        attempt = attempts.pop(sn, 1)
+        delay = scheduler.retry_delay(result, attempt)
+        if delay is not None:
+            log.debug(f"    - {result[output_new_status_header]} for SN {sn}. Retrying in {delay:.0f}s (attempt {attempt + 1}/{retry_max_attempts}).")
+            heapq.heappush(retry_heap, (time.monotonic() + delay, next(retry_order), attempt + 1, work_item))
+            continue
+        result["Attempts"] = attempt
+        recorder.record(result)
+        lookups_finished += 1
 
-        df_output = pd.concat([df_output, new_row_df], ignore_index=True)
+    # Normally the feeder is long done. If every worker gave up (e.g. Chrome would not start)
+    # it may still be waiting for queue space that will never free up.
+    stop_feeding.set()
+    feeder.join(timeout=10)
+    if feeder.is_alive():
+        log.warning("Warning: The input reader did not stop within 10s; leaving it behind.")
+    while True:
+        try:
+            message = result_queue.get_nowait()
+        except queue.Empty:
+            break
+        if message is None:
+            continue
+        kind, work_item, result = message
+        if kind == "input_done":
+            lookups_fed, input_complete = work_item, result
+        elif kind == "cached":
+            recorder.record(result)
+    if not workers_stopped:
+        # The workers exited on their own, before every serial had a result.
+        unprocessed = f"{lookups_fed - lookups_finished}" if lookups_fed is not None else "an unknown number of"
+        not_read = "" if input_complete else ", plus the rest of the input that was never read"
+        log.error(f"ERROR: All workers stopped; {unprocessed} serial number(s) were left unprocessed{not_read}. "
+                  "They will be looked up on the next run.")
+    for worker in workers:
+        worker.join()
+    scheduler.print_summary()
+    return workers_stopped
+
+
+# --- Async Engine ---
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def run_async_engine(work_stream, recorder):
+    bucket = TokenBucket(rate_limit_per_second, rate_limit_burst)
+    scheduler = RetryScheduler(async_max_concurrency)
+    pending = asyncio.Queue()
+    remaining = 0
+    feeding_done = False
+    all_done = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    # HTTP lookups run natively on the loop when httpx is installed. Anything that
+    # needs a blocking backend (Selenium, or requests without httpx) borrows one from
+    # a pool of num_workers backends and runs it on a thread.
+    async_http = None
+    blocking_backend_name = lookup_backend
+    if httpx is not None and lookup_backend in ("http", "http+selenium"):
+        async_http = AsyncHttpLookupBackend()
+        async_http.start()
+        blocking_backend_name = "selenium" if lookup_backend == "http+selenium" else None
+    elif lookup_backend in ("http", "http+selenium"):
+        log.warning("    - httpx is not installed; running HTTP lookups on worker threads instead.")
+
+    # Journal fsyncs and cache commits run on one writer thread, in order, off the event loop.
+    record_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="Recorder")
 
+    async def record(result):
         try:
-            df_output.to_excel(output_excel_file, index=False)
-            print(f"    - Results saved incrementally to '{output_excel_file}'")
+            await loop.run_in_executor(record_executor, recorder.record, result)
         except Exception as e:
-            print(f"    - WARNING: Could not save incremental results to '{output_excel_file}'. Is the file open? Details: {e}")
+            log.error(f"ERROR: Could not record the result for SN {result.get('Serial Number')}. DETAILS: {e}")
 
-        # Removed time.sleep(2) here. The next loop iteration will implicitly wait for the next page load.
+    blocking_backends = []
+    blocking_pool = asyncio.Queue()
+    if blocking_backend_name:
+        for worker_id in range(1, max(1, num_workers) + 1):
+            backend = create_lookup_backend(worker_id, blocking_backend_name)
+            blocking_backends.append(backend)
+            blocking_pool.put_nowait(backend)
 
-    print("\n--------------------------------------------------")
-    print("All serial numbers have been processed (or script terminated due to critical error).")
+    async def lookup_one(sn, pn_from_excel, device_name_from_input):
+        await bucket.acquire()
+        if async_http is not None:
+            result = await async_http.lookup_async(sn, pn_from_excel, device_name_from_input)
+            if not http_lookup_unresolved(result) or not blocking_backend_name:
+                return result
+            log.debug(f"    - Falling back to {blocking_backend_name} for SN {sn}.")
+        backend = await blocking_pool.get()
+        try:
+            # Lookups on the blocking backends start their session lazily on first use.
+            return await asyncio.to_thread(backend.lookup, sn, pn_from_excel, device_name_from_input)
+        finally:
+            blocking_pool.put_nowait(backend)
+
+    async def lookup_task():
+        nonlocal remaining
+        while True:
+            attempt, work_item = await pending.get()
+            sn, pn_from_excel, device_name_from_input = work_item
+            # Waits here while the retry scheduler has cut concurrency back.
+            while not scheduler.try_acquire_slot():
+                await asyncio.sleep(0.05)
+            try:
+                result = await lookup_one(sn, pn_from_excel, device_name_from_input)
+            except Exception as e:
+                log.warning(f"    - UNEXPECTED GLOBAL ERROR for SN {sn}: An unhandled error occurred: {e}")
+                result = make_error_result(sn, pn_from_excel, device_name_from_input, "Unhandled Script Error")
+            finally:
+                scheduler.release_slot()
+            if result is None:
+                result = make_error_result(sn, pn_from_excel, device_name_from_input, "Lookup Failed")
+
+            delay = scheduler.retry_delay(result, attempt)
+            if delay is not None:
+                log.debug(f"    - {result[output_new_status_header]} for SN {sn}. Retrying in {delay:.0f}s (attempt {attempt + 1}/{retry_max_attempts}).")
+                # Back of the queue, behind everything fed so far.
+                loop.call_later(delay, pending.put_nowait, (attempt + 1, work_item))
+                continue
 
-    if not df_output.empty:
+            result["Attempts"] = attempt
+            await record(result)
+            remaining -= 1
+            if feeding_done and remaining == 0:
+                all_done.set()
+
+    async def feed():
+        nonlocal remaining, feeding_done
+        work_iterator = iter(work_stream)
         try:
-            df_output.to_excel(output_excel_file, index=False)
-            print(f"Final results saved successfully to: '{output_excel_file}'")
+            while True:
+                # Parse the input off the loop, a batch at a time.
+                batch = await asyncio.to_thread(lambda: list(itertools.islice(work_iterator, 256)))
+                if not batch:
+                    break
+                for work_item, cached_result in batch:
+                    if cached_result is not None:
+                        await record(cached_result)
+                    else:
+                        remaining += 1
+                        pending.put_nowait((1, work_item))
+                # Keep the queue short so a huge input is not all held in memory.
+                while pending.qsize() > async_max_concurrency * 4:
+                    await asyncio.sleep(0.05)
         except Exception as e:
-            print(f"ERROR: Could not perform final save to '{output_excel_file}'. Please ensure the file is not open: {e}")
+            log.error(f"ERROR: Could not read the input file. DETAILS: {e}")
+        finally:
+            feeding_done = True
+            if remaining == 0:
+                all_done.set()
+
+    concurrency = max(1, async_max_concurrency)
+    log.info(f"Starting async engine: {concurrency} concurrent lookup(s), '{lookup_backend}' backend, "
+             f"rate limit {rate_limit_per_second}/s (burst {rate_limit_burst}).")
+    tasks = [asyncio.create_task(lookup_task()) for _ in range(concurrency)]
+    tasks.append(asyncio.create_task(feed()))
+    try:
+        await all_done.wait()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if async_http is not None:
+            await async_http.aclose()
+        for backend in blocking_backends:
+            await asyncio.to_thread(backend.close)
+        # Lets the writes already handed to the writer thread finish.
+        await asyncio.to_thread(record_executor.shutdown)
+    scheduler.print_summary()
+
+
+def run_lookup_engine(work_stream, recorder):
+    # Serials answered by the cache are recorded straight away; workers and browsers are only
+    # started once the first serial that needs a lookup turns up. Returns False when the run
+    # stopped early because no lookup worker was left.
+    work_items = iter(work_stream)
+    for work_item, cached_result in work_items:
+        if cached_result is None:
+            work_items = itertools.chain([(work_item, None)], work_items)
+            break
+        recorder.record(cached_result)
     else:
-        print("No results were generated for saving.")
+        log.info("All serial numbers already processed or no new serial numbers to check.")
+        return True
+
+    if lookup_engine == "async":
+        # Failed lookups come back as error results here, so the async engine always finishes.
+        asyncio.run(run_async_engine(work_items, recorder))
+        return True
+    return run_thread_engine(work_items, recorder)
+
+
+# --- Progress (one aggregated line at a fixed interval) ---
+class ProgressReporter:
+    def __init__(self, work_stream=None, interval_seconds=None, progress_path=None):
+        self.work_stream = work_stream
+        self.interval_seconds = interval_seconds or progress_interval_seconds
+        self.progress_file = open(progress_path, "a", encoding="utf-8") if progress_path else None
+        # advance() is called for every result; everything else happens on the reporter thread.
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.last_completed = 0
+        self.last_time = self.started
+        self.rate = None
+        self.last_logged_completed = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="Progress", daemon=True)
+        self.thread.start()
+
+    def advance(self, status):
+        with self.lock:
+            self.completed += 1
+            if status in error_statuses:
+                self.failed += 1
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            completed, failed = self.completed, self.failed
+        total, reading_finished = self.work_stream.progress_total() if self.work_stream else (completed, True)
+        total = max(total, completed)
+        if now > self.last_time:
+            interval_rate = (completed - self.last_completed) / (now - self.last_time)
+            # Smoothed so a single slow interval does not swing the ETA.
+            self.rate = interval_rate if self.rate is None else 0.3 * interval_rate + 0.7 * self.rate
+        self.last_completed, self.last_time = completed, now
+        return {
+            "ts": round(time.time(), 3),
+            "elapsed_seconds": round(now - self.started, 1),
+            "completed": completed,
+            "total": total,
+            "reading_finished": reading_finished,
+            "failed": failed,
+            "rate_per_second": round(self.rate or 0.0, 2),
+            # Unknown while the input is still being read (the total is only a lower bound).
+            "eta_seconds": round((total - completed) / self.rate) if self.rate and reading_finished else None,
+        }
+
+    def report(self):
+        snapshot = self.snapshot()
+        total_label = f"{snapshot['total']}" if snapshot["reading_finished"] else f"{snapshot['total']}+"
+        percentage = snapshot["completed"] / max(1, snapshot["total"]) * 100
+        eta = "n/a" if snapshot["eta_seconds"] is None else str(datetime.timedelta(seconds=snapshot["eta_seconds"]))
+        # The console only gets a line when something finished (e.g. not while retries back off).
+        if snapshot["completed"] != self.last_logged_completed:
+            self.last_logged_completed = snapshot["completed"]
+            log.info(f"Progress: {snapshot['completed']}/{total_label} ({percentage:.1f}%) | "
+                     f"{snapshot['rate_per_second']:.1f} serials/s | ETA {eta} | {snapshot['failed']} failed")
+        if self.progress_file is not None:
+            try:
+                self.progress_file.write(json.dumps(snapshot) + "\n")
+                self.progress_file.flush()
+            except OSError as e:
+                log.warning(f"Warning: Could not write progress to '{self.progress_file.name}': {e}")
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            self.report()
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.report()
+        if self.progress_file is not None:
+            self.progress_file.close()
+
+
+# --- Result Recording (progress, journal, latency summary) ---
+class ResultRecorder:
+    def __init__(self, journal_path, work_stream=None, cache=None):
+        self.journal_path = journal_path
+        self.journal = open(journal_path, "a", encoding="utf-8") if journal_path else None
+        self.work_stream = work_stream
+        self.cache = cache
+        self.progress = ProgressReporter(work_stream, progress_interval_seconds, progress_file)
+        self.lookup_seconds_by_mode = {}
+
+    def record(self, current_serial_result_dict):
+        self.progress.advance(current_serial_result_dict[output_new_status_header])
+        log.debug(f"--- Serial Number: {current_serial_result_dict['Serial Number']} - {current_serial_result_dict[output_new_status_header]} ---")
+
+        if "Lookup Seconds" in current_serial_result_dict:
+            self.lookup_seconds_by_mode.setdefault(current_serial_result_dict["Lookup Mode"], []).append(current_serial_result_dict["Lookup Seconds"])
+
+        profiler.count_status(current_serial_result_dict[output_new_status_header])
+        # Cache hits keep the time of the original lookup, so resumed rows age the same way.
+        current_serial_result_dict.setdefault("Fetched At", round(time.time(), 3))
+
+        # One journal row per input row of this serial (duplicates are fanned back out).
+        stage_started = time.perf_counter()
+        rows = self.work_stream.fan_out(current_serial_result_dict) if self.work_stream else [current_serial_result_dict]
+        self.write_rows(rows)
+        profiler.record("journal_append", stage_started, current_serial_result_dict["Serial Number"])
+
+        if self.cache is not None and current_serial_result_dict.get("Lookup Mode") != "cache":
+            try:
+                self.cache.put(current_serial_result_dict)
+            except sqlite3.Error as e:
+                log.warning(f"    - WARNING: Could not update the warranty cache. Details: {e}")
+
+    def write_rows(self, rows):
+        if self.work_stream:
+            rows = rows + self.work_stream.drain_late_rows()
+        if rows:
+            self.append_rows(rows)
+
+    def append_rows(self, rows):
+        for row in rows:
+            try:
+                append_to_journal(self.journal, row)
+            except Exception as e:
+                log.warning(f"    - WARNING: Could not append result to '{self.journal_path}'. Details: {e}")
+
+    def close(self):
+        # Duplicate rows found after their serial's last result was recorded.
+        self.write_rows([])
+        self.progress.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    def print_latency_summary(self):
+        # Per-serial latency for full page loads vs in-place form resets
+        for lookup_mode, durations in sorted(self.lookup_seconds_by_mode.items()):
+            durations.sort()
+            log.info(f"Lookup latency ({lookup_mode}): {len(durations)} serial(s), "
+                     f"mean {sum(durations) / len(durations):.2f}s, median {durations[len(durations) // 2]:.2f}s")
+
+
+# --- Warranty Dates ---
+# The last format covers dates migrated from an older Excel report by pandas.
+warranty_date_formats = ["%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y", "%Y-%m-%d", "%m/%d/%Y", "%d.%m.%Y", "%Y-%m-%d %H:%M:%S"]
+
+
+def parse_warranty_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    value = str(value or "").strip()
+    for date_format in warranty_date_formats:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+# --- Warranty Cache (SQLite, TTL per entry) ---
+class WarrantyCache:
+    def __init__(self, cache_path):
+        # Read by the input feeder thread, written by the result recorder.
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS warranty_cache (
+                serial_number TEXT NOT NULL,
+                product_number TEXT NOT NULL,
+                status TEXT NOT NULL,
+                start_date TEXT,
+                end_date TEXT,
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (serial_number, product_number)
+            )
+        """)
+        self.connection.commit()
+
+    @staticmethod
+    def ttl_seconds(status, end_date):
+        if status in error_statuses:
+            return 0
+        ttl_days = cache_ttl_days
+        warranty_end = parse_warranty_date(end_date)
+        if status.lower().startswith("active") and warranty_end is not None:
+            days_left = (warranty_end - datetime.date.today()).days
+            if days_left <= cache_near_expiry_window_days:
+                ttl_days = cache_near_expiry_ttl_days
+        return ttl_days * 86400
+
+    def get(self, sn, pn_from_excel):
+        # A lookup without the product number prompt is stored under "N/A".
+        product_numbers = ["N/A"]
+        if has_product_number(pn_from_excel):
+            product_numbers.insert(0, pn_from_excel)
+        placeholders = ",".join("?" for _ in product_numbers)
+        with self.lock:
+            row = self.connection.execute(
+                f"SELECT product_number, status, start_date, end_date, fetched_at FROM warranty_cache "
+                f"WHERE serial_number = ? AND product_number IN ({placeholders}) AND expires_at > ? "
+                f"ORDER BY fetched_at DESC LIMIT 1",
+                [sn.strip().upper(), *product_numbers, time.time()],
+            ).fetchone()
+        if row is None:
+            return None
+        product_number, status, start_date, end_date, fetched_at = row
+        return {
+            "Product Number Used": product_number,
+            output_new_status_header: status,
+            output_new_start_date_header: start_date,
+            output_new_end_date_header: end_date,
+            "Fetched At": fetched_at,
+        }
+
+    def put(self, result):
+        status = str(result.get(output_new_status_header, ""))
+        ttl = self.ttl_seconds(status, result.get(output_new_end_date_header))
+        if ttl <= 0:
+            return False
+        fetched_at = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO warranty_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(result["Serial Number"]).strip().upper(),
+                    str(result.get("Product Number Used") or "N/A"),
+                    status,
+                    str(result.get(output_new_start_date_header)),
+                    str(result.get(output_new_end_date_header)),
+                    fetched_at,
+                    fetched_at + ttl,
+                ),
+            )
+            self.connection.commit()
+        return True
+
+    def purge_expired(self):
+        with self.lock:
+            deleted = self.connection.execute("DELETE FROM warranty_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            self.connection.commit()
+        return deleted
+
+    def close(self):
+        self.connection.close()
+
+
+def open_warranty_cache():
+    if not use_warranty_cache:
+        return None
+    warranty_cache = WarrantyCache(warranty_cache_file)
+    purged = warranty_cache.purge_expired()
+    if purged:
+        log.info(f"Removed {purged} expired entr{'y' if purged == 1 else 'ies'} from '{warranty_cache_file}'.")
+    return warranty_cache
+
+
+# --- Result Journal (append-only JSON lines) ---
+def iter_journal(journal_path):
+    if not os.path.exists(journal_path):
+        return
+    with open(journal_path, "r", encoding="utf-8") as journal:
+        for line_number, line in enumerate(journal, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-write can leave a truncated last line; everything before it is still valid.
+                log.warning(f"Warning: Skipping unreadable line {line_number} in '{journal_path}'.")
+
+
+def load_journal(journal_path):
+    return list(iter_journal(journal_path))
+
+
+def journal_record_expired(record, now=None):
+    # Same TTL as the warranty cache. Final error statuses never expire, and neither do rows
+    # written before fetch times were journaled (no "Fetched At").
+    status = str(record.get(output_new_status_header) or "")
+    try:
+        fetched_at = float(record["Fetched At"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    if status in error_statuses:
+        return False
+    return fetched_at + WarrantyCache.ttl_seconds(status, record.get(output_new_end_date_header)) <= (now or time.time())
+
+
+def append_to_journal(journal, result):
+    journal.write(json.dumps(result, ensure_ascii=False) + "\n")
+    journal.flush()
+    os.fsync(journal.fileno())
+
+
+def seed_journal_from_excel(excel_path, journal_path):
+    # One-time migration so runs started before the journal existed can still resume.
+    df_existing_results = pd.read_excel(excel_path)
+    if "Serial Number" not in df_existing_results.columns:
+        log.warning(f"Warning: 'Serial Number' column not found in '{excel_path}'. Nothing to migrate.")
+        return 0
+    records = df_existing_results.astype(str).to_dict(orient="records")
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        for record in records:
+            append_to_journal(journal, record)
+    return len(records)
+
+
+# --- Report Output (batched sinks) ---
+class CsvOutputSink:
+    def __init__(self, path):
+        self.path = path
+        self.partial_path = f"{path}.partial"
+        self.file = open(self.partial_path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(output_columns_order)
+
+    def write_batch(self, rows):
+        # Dates as ISO text; values that were not dates ("Error", "N/A") are kept as they are.
+        self.writer.writerows(
+            [value.isoformat() if isinstance(value, datetime.date) else value for value in row] for row in rows
+        )
+
+    def close(self):
+        self.file.close()
+        os.replace(self.partial_path, self.path)
+
+
+class ParquetOutputSink:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Writing Parquet output requires the 'pyarrow' package.")
+        self.pa = pa
+        self.path = path
+        self.partial_path = f"{path}.partial"
+        self.schema = pa.schema([
+            (col, pa.date32() if col in output_date_columns else pa.string()) for col in output_columns_order
+        ])
+        self.writer = pq.ParquetWriter(self.partial_path, self.schema)
+
+    def write_batch(self, rows):
+        columns = []
+        for index, col in enumerate(output_columns_order):
+            if col in output_date_columns:
+                columns.append([row[index] if isinstance(row[index], datetime.date) else None for row in rows])
+            else:
+                columns.append([None if row[index] is None else str(row[index]) for row in rows])
+        self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+        os.replace(self.partial_path, self.path)
+
+
+class SqliteOutputSink:
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        quoted_columns = [f'"{col}"' for col in output_columns_order]
+        # Dates as ISO text, which sorts and compares correctly and works with SQLite's date().
+        column_definitions = ", ".join(
+            f"{quoted} {'DATE' if col in output_date_columns else 'TEXT'}" for col, quoted in zip(output_columns_order, quoted_columns)
+        )
+        self.insert_sql = f"INSERT INTO warranty_results ({', '.join(quoted_columns)}) VALUES ({', '.join('?' for _ in quoted_columns)})"
+        # The table is a snapshot of the report; it is replaced on every export.
+        self.connection.execute("DROP TABLE IF EXISTS warranty_results")
+        self.connection.execute(f"CREATE TABLE warranty_results ({column_definitions})")
+
+    def write_batch(self, rows):
+        date_indexes = {output_columns_order.index(col) for col in output_date_columns}
+        self.connection.executemany(self.insert_sql, [
+            [(value.isoformat() if isinstance(value, datetime.date) else None) if index in date_indexes
+             else (None if value is None else str(value)) for index, value in enumerate(row)]
+            for row in rows
+        ])
+
+    def close(self):
+        self.connection.execute(f'CREATE INDEX IF NOT EXISTS warranty_results_end_date ON warranty_results ("{output_new_end_date_header}")')
+        self.connection.commit()
+        self.connection.close()
+
+
+class ExcelOutputSink:
+    def __init__(self, path):
+        # Streams rows into a write-only workbook instead of building a DataFrame first.
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet()
+        self.worksheet.append(output_columns_order)
+
+    def write_batch(self, rows):
+        for row in rows:
+            cells = []
+            for value in row:
+                if isinstance(value, datetime.date):
+                    value = WriteOnlyCell(self.worksheet, value=value)
+                    value.number_format = "yyyy-mm-dd"
+                cells.append(value)
+            self.worksheet.append(cells)
+
+    def close(self):
+        partial_path = f"{self.path}.partial"
+        self.workbook.save(partial_path)
+        os.replace(partial_path, self.path)
+
+
+output_sink_classes = {
+    "csv": CsvOutputSink,
+    "parquet": ParquetOutputSink,
+    "sqlite": SqliteOutputSink,
+    "xlsx": ExcelOutputSink,
+}
+
+
+def output_row(record):
+    row = []
+    for col in output_columns_order:
+        value = record.get(col, "N/A")
+        if col in output_date_columns:
+            # Parsed once here; every sink gets the same date (or the original text if it is not one).
+            value = parse_warranty_date(value) or value
+        row.append(value)
+    return row
+
+
+def export_journal(journal_path, output_paths):
+    return export_results(lambda: iter_journal(journal_path), output_paths)
+
+
+def export_results(load_records, output_paths):
+    # load_records() is read twice: once to find the latest entry of every device/serial,
+    # then again to stream those entries out in batches.
+    latest_position = {}
+    for position, record in enumerate(load_records()):
+        # Later journal entries supersede earlier ones for the same device/serial.
+        latest_position[(record.get(output_new_device_name_header), record.get("Serial Number"))] = position
+    if not latest_position:
+        log.info("No results were generated for saving.")
+        return False
+
+    sinks = {}
+    for output_format, path in output_paths.items():
+        try:
+            sinks[output_format] = output_sink_classes[output_format](path)
+        except Exception as e:
+            log.error(f"ERROR: Could not create '{path}'. Please ensure the file is not open: {e}")
+
+    def write_batch(rows):
+        for output_format, sink in list(sinks.items()):
+            try:
+                sink.write_batch(rows)
+            except Exception as e:
+                log.error(f"ERROR: Could not write '{output_paths[output_format]}': {e}")
+                del sinks[output_format]
+
+    batch = []
+    for position, record in enumerate(load_records()):
+        if latest_position.get((record.get(output_new_device_name_header), record.get("Serial Number"))) != position:
+            continue
+        batch.append(output_row(record))
+        if len(batch) >= output_batch_rows:
+            write_batch(batch)
+            batch = []
+    if batch:
+        write_batch(batch)
+
+    exported = False
+    for output_format, sink in sinks.items():
+        try:
+            sink.close()
+            log.info(f"Results exported successfully to: '{output_paths[output_format]}' ({len(latest_position)} row(s))")
+            exported = True
+        except Exception as e:
+            log.error(f"ERROR: Could not save '{output_paths[output_format]}'. Please ensure the file is not open: {e}")
+    return exported
+
+
+def output_paths_for(formats):
+    return {output_format: output_files[output_format] for output_format in formats}
+
+# --- Sharded Runs (coordinator and workers sharing a SQLite store) ---
+class ShardStore:
+    def __init__(self, store_path):
+        # Transactions are explicit so a shard claim can hold BEGIN IMMEDIATE. The store stays
+        # in rollback-journal mode because WAL does not work on network shares.
+        self.store_path = store_path
+        self.connection = sqlite3.connect(store_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS shards (
+                shard_id INTEGER PRIMARY KEY,
+                serial_count INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS shard_rows (
+                shard_id INTEGER NOT NULL,
+                row_index INTEGER NOT NULL,
+                serial_number TEXT NOT NULL,
+                product_number TEXT NOT NULL,
+                device_name TEXT NOT NULL,
+                PRIMARY KEY (shard_id, row_index)
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                serial_number TEXT NOT NULL,
+                device_name TEXT NOT NULL,
+                shard_id INTEGER NOT NULL,
+                record TEXT NOT NULL,
+                worker TEXT,
+                recorded_at REAL NOT NULL,
+                PRIMARY KEY (serial_number, device_name)
+            );
+            CREATE INDEX IF NOT EXISTS results_by_shard ON results (shard_id);
+        """)
+
+    def run_transaction(self, work, immediate=False):
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                outcome = work(self.connection)
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+        return outcome
+
+    def shard_count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM shards").fetchone()[0]
+
+    def split_input(self, input_rows, serials_per_shard):
+        # Every row of a serial goes to the shard of its first occurrence, so duplicates are
+        # still fanned out by a single worker.
+        def split(connection):
+            shard_of_serial = {}
+            serial_counts = {}
+            shard_id = 1
+            batch = []
+            for row_index, (sn, pn_from_excel, device_name_from_input) in enumerate(input_rows):
+                target = shard_of_serial.get(sn)
+                if target is None:
+                    if serial_counts.get(shard_id, 0) >= serials_per_shard:
+                        shard_id += 1
+                    target = shard_of_serial[sn] = shard_id
+                    serial_counts[shard_id] = serial_counts.get(shard_id, 0) + 1
+                batch.append((target, row_index, sn, pn_from_excel, device_name_from_input))
+                if len(batch) >= 5000:
+                    connection.executemany("INSERT INTO shard_rows VALUES (?, ?, ?, ?, ?)", batch)
+                    batch = []
+            connection.executemany("INSERT INTO shard_rows VALUES (?, ?, ?, ?, ?)", batch)
+            connection.executemany("INSERT INTO shards (shard_id, serial_count) VALUES (?, ?)", serial_counts.items())
+            return len(serial_counts), len(shard_of_serial)
+        return self.run_transaction(split, immediate=True)
+
+    def claim_shard(self, owner, lease_seconds):
+        # A pending shard (past its retry delay, if it was released for another pass), or one
+        # whose owner stopped renewing its lease.
+        def claim(connection):
+            now = time.time()
+            row = connection.execute(
+                "SELECT shard_id FROM shards WHERE (status = 'pending' AND (lease_expires IS NULL OR lease_expires < ?)) "
+                "OR (status = 'leased' AND lease_expires < ?) ORDER BY shard_id LIMIT 1", (now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE shards SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE shard_id = ?",
+                (owner, now + lease_seconds, row[0]),
+            )
+            return row[0]
+        return self.run_transaction(claim, immediate=True)
+
+    def renew_lease(self, shard_id, owner, lease_seconds):
+        # False when the lease expired and another worker has taken the shard over.
+        with self.lock:
+            renewed = self.connection.execute(
+                "UPDATE shards SET lease_expires = ? WHERE shard_id = ? AND owner = ? AND status = 'leased'",
+                (time.time() + lease_seconds, shard_id, owner),
+            ).rowcount
+        return renewed == 1
+
+    def complete_shard(self, shard_id, owner, status="done"):
+        # status is "done", or "incomplete" when serials were still left without a result.
+        # False when the lease was taken over; the new owner completes the shard instead.
+        with self.lock:
+            completed = self.connection.execute(
+                "UPDATE shards SET status = ?, lease_expires = NULL, finished_at = ? "
+                "WHERE shard_id = ? AND owner = ? AND status = 'leased'",
+                (status, time.time(), shard_id, owner),
+            ).rowcount
+        return completed == 1
+
+    def release_shard(self, shard_id, owner, retry_after, count_pass=True):
+        # Back to pending for another pass; claimable again once retry_after has passed.
+        # count_pass=False hands back a claim that never got to look anything up.
+        with self.lock:
+            released = self.connection.execute(
+                "UPDATE shards SET status = 'pending', owner = NULL, lease_expires = ?, attempts = attempts - ? "
+                "WHERE shard_id = ? AND owner = ? AND status = 'leased'",
+                (retry_after, 0 if count_pass else 1, shard_id, owner),
+            ).rowcount
+        return released == 1
+
+    def shard_attempts(self, shard_id):
+        with self.lock:
+            return self.connection.execute("SELECT attempts FROM shards WHERE shard_id = ?", (shard_id,)).fetchone()[0]
+
+    def transient_result_counts(self, shard_id=None):
+        # {shard_id: number of results with a transient status}
+        query, params = "SELECT shard_id, record FROM results", ()
+        if shard_id is not None:
+            query, params = query + " WHERE shard_id = ?", (shard_id,)
+        counts = {}
+        with self.lock:
+            for result_shard_id, record in self.connection.execute(query, params):
+                if json.loads(record).get(output_new_status_header) in transient_statuses:
+                    counts[result_shard_id] = counts.get(result_shard_id, 0) + 1
+        return counts
+
+    def missing_serial_count(self, shard_id):
+        # Serials of the shard that have no result row at all.
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(DISTINCT serial_number) FROM shard_rows WHERE shard_id = ? "
+                "AND serial_number NOT IN (SELECT serial_number FROM results WHERE shard_id = ?)",
+                (shard_id, shard_id),
+            ).fetchone()[0]
+
+    def reopen_shards(self):
+        # Incomplete shards, and finished ones that still hold transient failures, get a fresh
+        # set of passes.
+        transient_shard_ids = list(self.transient_result_counts())
+
+        def reopen(connection):
+            reopen_sql = ("UPDATE shards SET status = 'pending', owner = NULL, lease_expires = NULL, attempts = 0, "
+                          "finished_at = NULL WHERE ")
+            reopened = connection.execute(reopen_sql + "status = 'incomplete'").rowcount
+            for shard_id in transient_shard_ids:
+                reopened += connection.execute(reopen_sql + "shard_id = ? AND status = 'done'", (shard_id,)).rowcount
+            return reopened
+        return self.run_transaction(reopen, immediate=True)
+
+    def shard_rows(self, shard_id):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT serial_number, product_number, device_name FROM shard_rows WHERE shard_id = ? ORDER BY row_index",
+                (shard_id,),
+            ).fetchall()
+
+    def shard_results(self, shard_id):
+        # Results reported by earlier leases of this shard, so a taken-over shard resumes.
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT record FROM results WHERE shard_id = ? ORDER BY recorded_at", (shard_id,),
+            ).fetchall()
+        processed_results = {}
+        for (record,) in rows:
+            record = json.loads(record)
+            # Transient failures are looked up again.
+            if record.get(output_new_status_header) not in transient_statuses:
+                processed_results[normalize_serial(record.get("Serial Number"))] = record
+        return processed_results
+
+    def add_results(self, shard_id, owner, rows):
+        recorded_at = time.time()
+        self.run_transaction(lambda connection: connection.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+            [(normalize_serial(row.get("Serial Number")), str(row.get(output_new_device_name_header, "")), shard_id,
+              json.dumps(row, ensure_ascii=False), owner, recorded_at) for row in rows],
+        ))
+
+    def status_counts(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'expired' ELSE status END, COUNT(*) "
+                "FROM shards GROUP BY 1", (time.time(),),
+            ).fetchall()
+        return dict(rows)
+
+    def iter_results(self):
+        cursor = self.connection.cursor()
+        with self.lock:
+            cursor.execute("SELECT record FROM results ORDER BY shard_id, recorded_at")
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(output_batch_rows)
+            if not rows:
+                break
+            for (record,) in rows:
+                yield json.loads(record)
+
+    def close(self):
+        self.connection.close()
+
+
+class ShardResultRecorder(ResultRecorder):
+    # Reports every result row to the shared store instead of the local journal.
+    def __init__(self, shard_store, shard_id, owner, work_stream=None, cache=None):
+        super().__init__(None, work_stream, cache)
+        self.shard_store = shard_store
+        self.shard_id = shard_id
+        self.owner = owner
+
+    def append_rows(self, rows):
+        try:
+            self.shard_store.add_results(self.shard_id, self.owner, rows)
+        except sqlite3.Error as e:
+            log.warning(f"    - WARNING: Could not report results to '{self.shard_store.store_path}'. Details: {e}")
+
+
+def format_shard_status(status_counts):
+    return ", ".join(f"{count} {status}" for status, count in sorted(status_counts.items())) or "no shards"
+
+
+def renew_shard_lease(shard_store, shard_id, owner, stop_event):
+    while not stop_event.wait(shard_lease_seconds / 3):
+        try:
+            if not shard_store.renew_lease(shard_id, owner, shard_lease_seconds):
+                log.warning(f"WARNING: Lost the lease on shard {shard_id}; another worker has taken it over.")
+                return
+        except sqlite3.Error as e:
+            log.warning(f"WARNING: Could not renew the lease on shard {shard_id}. Details: {e}")
+
+
+def run_shard_worker(shard_store, warranty_cache):
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    shards_done = 0
+    reopened = shard_store.reopen_shards()
+    if reopened:
+        log.info(f"Reopened {reopened} shard(s) with serials that still need a lookup.")
+    while True:
+        shard_id = shard_store.claim_shard(owner, shard_lease_seconds)
+        if shard_id is None:
+            status_counts = shard_store.status_counts()
+            if not any(status_counts.get(status) for status in ("pending", "leased", "expired")):
+                break
+            # Other workers still hold leases; one of them may die and leave its shard behind.
+            log.info(f"No shard to claim ({format_shard_status(status_counts)}). Checking again in {shard_poll_seconds}s...")
+            time.sleep(shard_poll_seconds)
+            continue
+
+        log.info(f"=== Worker {owner}: processing shard {shard_id} ===")
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target=renew_shard_lease, args=(shard_store, shard_id, owner, stop_heartbeat), daemon=True)
+        heartbeat.start()
+        work_stream = SerialWorkStream(iter(shard_store.shard_rows(shard_id)), shard_store.shard_results(shard_id), warranty_cache)
+        recorder = ShardResultRecorder(shard_store, shard_id, owner, work_stream, warranty_cache)
+        try:
+            finished = run_lookup_engine(work_stream, recorder)
+        finally:
+            recorder.close()
+            stop_heartbeat.set()
+            heartbeat.join()
+        # Left leased on a crash or Ctrl+C, so the lease expires and another worker resumes it.
+        if not finished:
+            # Every lookup worker gave up (e.g. Chrome would not start); the next shard would fare no better.
+            shard_store.release_shard(shard_id, owner, time.time(), count_pass=False)
+            log.error(f"ERROR: No lookup worker could run on this host. Shard {shard_id} went back to the queue; "
+                      "this worker stops claiming shards.")
+            break
+
+        missing = shard_store.missing_serial_count(shard_id)
+        transient_left = shard_store.transient_result_counts(shard_id).get(shard_id, 0)
+        if (missing or transient_left) and shard_store.shard_attempts(shard_id) < shard_max_passes:
+            if shard_store.release_shard(shard_id, owner, time.time() + shard_retry_delay_seconds):
+                log.info(f"Shard {shard_id} still has {missing} serial(s) without a result and {transient_left} transient failure(s). "
+                         f"It goes back to the queue for another pass in {shard_retry_delay_seconds}s.")
+            else:
+                log.warning(f"WARNING: Shard {shard_id} was taken over by another worker before it finished here; leaving it to them.")
+            continue
+        final_status = "incomplete" if missing else "done"
+        if missing or transient_left:
+            log.warning(f"WARNING: Shard {shard_id} still has {missing} serial(s) without a result and {transient_left} transient "
+                        f"failure(s) after {shard_max_passes} pass(es); marked {final_status}. Start a worker again later to retry them.")
+        if not shard_store.complete_shard(shard_id, owner, final_status):
+            log.warning(f"WARNING: Shard {shard_id} was taken over by another worker before it finished here; leaving it to them.")
+            continue
+        if final_status == "done":
+            shards_done += 1
+    return shards_done
+
+
+# --- Main Script Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check HP warranty status for a list of serial numbers.")
+    parser.add_argument("--input", default=serial_number_file, help="Excel file with the serial numbers to check.")
+    parser.add_argument("--export", action="store_true", help="Only build the reports from the results journal.")
+    parser.add_argument("--output-format", nargs="+", choices=sorted(output_sink_classes), default=output_formats,
+                        help="Report formats to write (xlsx is optional; parquet needs pyarrow).")
+    parser.add_argument("--new-run", action="store_true", help="Archive the current results journal and start over; fresh results come from the warranty cache.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the local warranty cache.")
+    parser.add_argument("--offline", action="store_true", help="Never download or version-check chromedriver; use the cached/pinned one.")
+    parser.add_argument("--refresh-driver", action="store_true", help="Resolve chromedriver again instead of using the cached path.")
+    parser.add_argument("--trace", default=trace_file, help="JSON-lines file for per-stage timings ('' disables).")
+    parser.add_argument("--workers", type=int, default=num_workers, help="Number of parallel lookup workers.")
+    parser.add_argument("--engine", choices=["threads", "async"], default=lookup_engine, help="Lookup engine to use.")
+    parser.add_argument("--concurrency", type=int, default=async_max_concurrency, help="Maximum concurrent lookups for the async engine.")
+    parser.add_argument("--rate-limit", type=float, default=rate_limit_per_second, help="Maximum lookups started per second by the async engine (0 disables).")
+    parser.add_argument("--backend", choices=["selenium", "http", "http+selenium"], default=lookup_backend,
+                        help="Lookup backend to use. 'http' and 'http+selenium' are experimental (unverified endpoint).")
+    parser.add_argument("--http-base-url", default=http_api_base_url, help="Base URL for the HTTP backend (e.g. a local hp_mock_server.py).")
+    parser.add_argument("--mode", choices=["local", "coordinator", "worker", "merge"], default="local",
+                        help="local: one host. coordinator: split the input into shards in --store. "
+                             "worker: process shards from --store. merge: build the report from --store.")
+    parser.add_argument("--store", default=shard_store_file, help="Shared SQLite shard store for the coordinator/worker/merge modes.")
+    parser.add_argument("--shard-size", type=int, default=shard_size, help="Unique serial numbers per shard (coordinator mode).")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default=log_level, help="Console/log file verbosity.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Same as --log-level DEBUG: log every step of every lookup.")
+    parser.add_argument("--log-file", default=log_file, help="Also write a timestamped log to this file.")
+    parser.add_argument("--progress-interval", type=float, default=progress_interval_seconds, help="Seconds between progress updates.")
+    parser.add_argument("--progress-file", default=progress_file, help="Append progress snapshots to this JSON-lines file.")
+    args = parser.parse_args()
+    log_level = "DEBUG" if args.verbose else args.log_level
+    setup_logging(log_level, args.log_file)
+    progress_interval_seconds = max(0.1, args.progress_interval)
+    progress_file = args.progress_file
+    serial_number_file = args.input
+    num_workers = args.workers
+    lookup_engine = args.engine
+    async_max_concurrency = args.concurrency
+    rate_limit_per_second = args.rate_limit
+    use_warranty_cache = use_warranty_cache and not args.no_cache
+    trace_file = args.trace or None
+    offline_mode = offline_mode or args.offline
+    lookup_backend = args.backend
+    if args.refresh_driver and lookup_backend != "http":
+        resolve_chromedriver_path(refresh=True)
+    http_api_base_url = args.http_base_url
+    shard_store_file = args.store
+    output_formats = args.output_format
+    shard_size = max(1, args.shard_size)
+
+    # Build the reports from the journal on demand, without looking anything up.
+    if args.export:
+        export_journal(results_journal_file, output_paths_for(output_formats))
+        exit()
+
+    # Sharded runs: merge and worker modes only talk to the shared store.
+    if args.mode in ("merge", "worker"):
+        if not os.path.exists(shard_store_file):
+            log.error(f"ERROR: Shard store '{shard_store_file}' not found. Run with --mode coordinator first.")
+            exit()
+        shard_store = ShardStore(shard_store_file)
+        if args.mode == "merge":
+            status_counts = shard_store.status_counts()
+            log.info(f"Shard store '{shard_store_file}': {format_shard_status(status_counts)}.")
+            if set(status_counts) - {"done"}:
+                log.warning("Warning: Not every shard is done yet; the report will be incomplete.")
+            export_results(shard_store.iter_results, output_paths_for(output_formats))
+            shard_store.close()
+            exit()
+
+        warranty_cache = open_warranty_cache()
+        profiler.open_trace(trace_file)
+        adaptive_waits.load(wait_profile_file)
+        try:
+            shards_done = run_shard_worker(shard_store, warranty_cache)
+        finally:
+            spare_drivers.close()
+            adaptive_waits.save(wait_profile_file)
+            if warranty_cache is not None:
+                warranty_cache.close()
+        log.info("--------------------------------------------------")
+        log.info(f"This worker finished {shards_done} shard(s). "
+                 f"Store: {format_shard_status(shard_store.status_counts())}.")
+        log.info("Run with --mode merge to build the combined report.")
+        shard_store.close()
+        profiler.print_summary()
+        profiler.close()
+        exit()
+
+    # A new run keeps the previous journal (or shard store) for reference but no longer resumes from it.
+    previous_state_file = shard_store_file if args.mode == "coordinator" else results_journal_file
+    if args.new_run and os.path.exists(previous_state_file):
+        base_name, extension = os.path.splitext(previous_state_file)
+        archived_file = f"{base_name}.{datetime.datetime.now():%Y%m%d-%H%M%S}{extension}"
+        os.replace(previous_state_file, archived_file)
+        log.info(f"Archived previous {'shard store' if args.mode == 'coordinator' else 'results journal'} to '{archived_file}'.")
+
+    # Resume Logic: Load existing results from the journal (sharded runs resume from the shard store)
+    processed_results = {}
+    journaled_rows = set()
+    if args.mode == "local":
+        if not args.new_run and not os.path.exists(results_journal_file) and os.path.exists(output_excel_file):
+            log.info(f"'{output_excel_file}' found without a journal. Migrating previous results to '{results_journal_file}'...")
+            try:
+                migrated = seed_journal_from_excel(output_excel_file, results_journal_file)
+                log.info(f"Migrated {migrated} previous result(s).")
+            except Exception as e:
+                log.warning(f"Error reading existing results file '{output_excel_file}': {e}. Starting fresh.")
+
+        if os.path.exists(results_journal_file):
+            log.info(f"'{results_journal_file}' found. Checking for previously processed serial numbers...")
+            transient_failures = set()
+            expired_results = set()
+            now = time.time()
+            for record in iter_journal(results_journal_file):
+                sn = normalize_serial(record.get("Serial Number"))
+                journaled_rows.add((str(record.get(output_new_device_name_header, "")), sn))
+                # Transient failures (timeouts, lost sessions, HTTP errors) are looked up again.
+                if record.get(output_new_status_header) in transient_statuses:
+                    transient_failures.add(sn)
+                    continue
+                # So are results older than their cache TTL.
+                if journal_record_expired(record, now):
+                    expired_results.add(sn)
+                    continue
+                processed_results[sn] = record
+            transient_failures -= processed_results.keys()
+            expired_results -= processed_results.keys() | transient_failures
+            log.info(f"Found {len(processed_results)} serial numbers already processed.")
+            if transient_failures:
+                log.info(f"{len(transient_failures)} serial number(s) with transient failures will be looked up again.")
+            if expired_results:
+                log.info(f"{len(expired_results)} serial number(s) with results older than the cache TTL will be looked up again.")
+        else:
+            log.info(f"'{results_journal_file}' not found. Starting a new results journal.")
+
+    # Read Input Serial Numbers (streamed: lookups start while the file is still being read)
+    if not os.path.exists(serial_number_file):
+        log.error(f"ERROR: The file '{serial_number_file}' was not found.")
+        log.error("Please ensure the Excel file exists at the specified path.")
+        exit()
+
+    try:
+        input_rows = open_input_rows(serial_number_file)
+    except KeyError as e:
+        log.error(f"ERROR: The input file must contain a column named {e}.")
+        log.error("Please check the column headers in your input file or update the COLUMN_NAME variables in the script.")
+        exit()
+    except Exception as e:
+        log.error(f"ERROR: Could not read the input file '{serial_number_file}'.")
+        log.error(f"DETAILS: {e}")
+        log.error("Please ensure the file is a valid Excel/CSV/Parquet file and not open in another program.")
+        exit()
+
+    if args.mode == "coordinator":
+        shard_store = ShardStore(shard_store_file)
+        if shard_store.shard_count():
+            log.info(f"Shard store '{shard_store_file}' is already split ({format_shard_status(shard_store.status_counts())}). "
+                     "Start workers with --mode worker, or use --new-run to split the input again.")
+        else:
+            try:
+                shard_total, serial_total = shard_store.split_input(input_rows, shard_size)
+            except Exception as e:
+                log.error(f"ERROR: Could not split the input file into '{shard_store_file}'. DETAILS: {e}")
+                exit()
+            log.info(f"Split {serial_total} unique serial number(s) into {shard_total} shard(s) of up to {shard_size} in '{shard_store_file}'.")
+            log.info("Start workers on each host with --mode worker, then build the report with --mode merge.")
+        shard_store.close()
+        exit()
+
+    warranty_cache = open_warranty_cache()
+    profiler.open_trace(trace_file)
+    adaptive_waits.load(wait_profile_file)
+    work_stream = SerialWorkStream(input_rows, processed_results, warranty_cache, journaled_rows)
+    recorder = ResultRecorder(results_journal_file, work_stream, warranty_cache)
+    try:
+        run_lookup_engine(work_stream, recorder)
+    finally:
+        recorder.close()
+        spare_drivers.close()
+        adaptive_waits.save(wait_profile_file)
+        if warranty_cache is not None:
+            warranty_cache.close()
+
+    log.info("--------------------------------------------------")
+    log.info("All serial numbers have been processed (or script terminated due to critical error).")
+    recorder.print_latency_summary()
+
+    stage_started = time.perf_counter()
+    export_journal(results_journal_file, output_paths_for(output_formats))
+    profiler.record("report_export", stage_started)
+    profiler.print_summary()
+    profiler.close()
+    if trace_file:
+        log.info(f"Stage trace written to '{trace_file}'.")
 
-    if driver:
-        driver.quit()
-    print("WebDriver closed. Script finished.")
-    print("--------------------------------------------------")
+    log.info("Lookup backends closed. Script finished.")
+    log.info("--------------------------------------------------")
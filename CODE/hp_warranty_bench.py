@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import psutil  # Optional: adds Chrome/chromedriver child processes to the memory figures.
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import pandas as pd
+
+import hp_mock_server
+import hp_warranty as hw
+
+# --- Offline benchmark for hp_warranty.py ---
+# Runs the real lookup engines and backends against hp_mock_server.py with synthetic
+# serials and reports throughput, memory per worker and the cost of saving output.
+#   python hp_warranty_bench.py --serials 1000 10000
+#   python hp_warranty_bench.py --backend selenium --serials 200 --workers 4 --prompt-rate 0.2
+
+
+# --- Memory Sampling ---
+def current_memory_mb():
+    if psutil is not None:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+    if resource is not None:
+        # Peak RSS of this process only (kilobytes on Linux, bytes on macOS).
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return None
+
+
+class MemorySampler:
+    def __init__(self, interval_seconds=0.5):
+        self.interval_seconds = interval_seconds
+        self.baseline_mb = current_memory_mb()
+        self.peak_mb = self.baseline_mb
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            sample = current_memory_mb()
+            if sample is not None:
+                self.peak_mb = max(self.peak_mb or 0, sample)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop_event.set()
+        self.thread.join()
+
+
+# --- Output Save Cost ---
+def legacy_save_seconds(journal_path, excel_path, sample_rows):
+    # The pre-journal behaviour: concat one row and rewrite the whole workbook per serial.
+    records = hw.load_journal(journal_path)[:sample_rows]
+    df_output = pd.DataFrame(columns=hw.output_columns_order)
+    started = time.perf_counter()
+    for record in records:
+        new_row_df = pd.DataFrame([record])[hw.output_columns_order]
+        df_output = pd.concat([df_output, new_row_df], ignore_index=True)
+        df_output.to_excel(excel_path, index=False)
+    return time.perf_counter() - started
+
+
+# --- Benchmark Run ---
+def configure_lookup(args, base_url, work_dir):
+    hw.website_url = base_url + hp_mock_server.check_warranty_page
+    hw.http_api_base_url = base_url
+    hw.lookup_backend = args.backend
+    hw.lookup_engine = args.engine
+    hw.num_workers = args.workers
+    hw.async_max_concurrency = args.concurrency
+    hw.rate_limit_per_second = args.rate_limit
+    hw.session_cookie_file = os.path.join(work_dir, "session_cookies.json")
+    # Fresh counters and spare browsers for every run size.
+    hw.profiler = hw.RunProfiler()
+    hw.spare_drivers = hw.SpareDriverPool()
+
+
+def run_benchmark(serial_count, args):
+    server, base_url = hp_mock_server.start_mock_server(
+        latency_ms=args.latency_ms, latency_jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        prompt_rate=args.prompt_rate, cookie_banner=args.cookie_banner, synthetic=True,
+    )
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            configure_lookup(args, base_url, work_dir)
+            journal_path = os.path.join(work_dir, "results.jsonl")
+            excel_path = os.path.join(work_dir, "results.xlsx")
+
+            input_rows = ((f"BENCH{index:07d}", "", f"Device {index}") for index in range(serial_count))
+            work_stream = hw.SerialWorkStream(input_rows)
+            recorder = hw.ResultRecorder(journal_path, work_stream)
+
+            started = time.perf_counter()
+            with MemorySampler() as memory:
+                try:
+                    if args.engine == "async":
+                        hw.asyncio.run(hw.run_async_engine(work_stream, recorder))
+                    else:
+                        hw.run_thread_engine(work_stream, recorder)
+                finally:
+                    recorder.close()
+                    hw.spare_drivers.close()
+            elapsed = time.perf_counter() - started
+
+            # Each report format is timed on its own.
+            export_seconds = {}
+            for output_format in args.output_format:
+                output_path = os.path.join(work_dir, f"results.{output_format}")
+                export_started = time.perf_counter()
+                hw.export_journal(journal_path, {output_format: output_path})
+                export_seconds[output_format] = time.perf_counter() - export_started
+
+            legacy_rows = min(serial_count, args.legacy_save_sample)
+            legacy_seconds = legacy_save_seconds(journal_path, excel_path, legacy_rows) if legacy_rows else None
+            journal_bytes = os.path.getsize(journal_path)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    profile = hw.profiler.summary()
+    sessions = args.concurrency if args.engine == "async" and args.backend == "http" else args.workers
+    memory_per_session = None
+    if memory.baseline_mb is not None and memory.peak_mb is not None:
+        memory_per_session = max(0.0, memory.peak_mb - memory.baseline_mb) / max(1, sessions)
+    journal_append = profile["stages"].get("journal_append", {})
+    return {
+        "serials": serial_count,
+        "backend": args.backend,
+        "engine": args.engine,
+        "elapsed_seconds": elapsed,
+        "serials_per_second": profile["serials"] / elapsed if elapsed > 0 else 0.0,
+        "statuses": profile["statuses"],
+        "stages": profile["stages"],
+        "peak_memory_mb": memory.peak_mb,
+        "memory_per_session_mb": memory_per_session,
+        "journal_append_p50_ms": journal_append.get("p50", 0.0) * 1000,
+        "journal_bytes": journal_bytes,
+        "export_seconds": export_seconds,
+        "legacy_save_seconds": legacy_seconds,
+        "legacy_save_rows": legacy_rows,
+        "mock_requests": server.request_count,
+    }
+
+
+def print_report(report):
+    print(f"\n=== {report['serials']} serial(s): backend '{report['backend']}', engine '{report['engine']}' ===")
+    print(f"    Throughput:          {report['serials_per_second']:.1f} serials/s ({report['elapsed_seconds']:.2f}s total, {report['mock_requests']} mock request(s))")
+    if report["memory_per_session_mb"] is not None:
+        print(f"    Memory:              {report['memory_per_session_mb']:.1f} MB per worker (peak {report['peak_memory_mb']:.1f} MB)")
+    else:
+        print("    Memory:              n/a (install psutil)")
+    print(f"    Journal append:      {report['journal_append_p50_ms']:.3f} ms p50 per serial ({report['journal_bytes'] / 1024:.0f} KB)")
+    for output_format, seconds in report["export_seconds"].items():
+        print(f"    {output_format + ' export:':<21}{seconds:.2f}s (once, at the end of the run)")
+    if report["legacy_save_seconds"] is not None:
+        print(f"    Legacy per-row save: {report['legacy_save_seconds']:.2f}s for the first {report['legacy_save_rows']} serial(s)")
+    for stage, stats in sorted(report["stages"].items()):
+        print(f"    {stage:<22} p50 {stats['p50'] * 1000:8.1f} ms   p95 {stats['p95'] * 1000:8.1f} ms   p99 {stats['p99'] * 1000:8.1f} ms")
+    print(f"    Statuses:            {report['statuses']}")
+
+
+# --- Main Script Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark for hp_warranty.py against a local mock of the HP page.")
+    parser.add_argument("--serials", type=int, nargs="+", default=[1000, 10000], help="Synthetic run sizes.")
+    parser.add_argument("--backend", choices=["selenium", "http", "http+selenium"], default="http")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads")
+    parser.add_argument("--workers", type=int, default=hw.num_workers)
+    parser.add_argument("--concurrency", type=int, default=hw.async_max_concurrency)
+    parser.add_argument("--rate-limit", type=float, default=0, help="Token bucket rate for the async engine (0 disables).")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Mock latency per request.")
+    parser.add_argument("--jitter-ms", type=float, default=10, help="Random extra mock latency per request.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock requests answered with HTTP 503.")
+    parser.add_argument("--prompt-rate", type=float, default=0.1, help="Fraction of serials that need a product number.")
+    parser.add_argument("--cookie-banner", choices=["button", "iframe", "none"], default="button")
+    parser.add_argument("--output-format", nargs="+", choices=sorted(hw.output_sink_classes), default=["csv", "parquet", "sqlite", "xlsx"],
+                        help="Report formats to time (parquet needs pyarrow).")
+    parser.add_argument("--legacy-save-sample", type=int, default=0, help="Also time the old per-row Excel rewrite for this many rows.")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="ERROR",
+                        help="Verbosity of the lookup log while benchmarking.")
+    parser.add_argument("--json-report", help="Write the results as JSON to this file.")
+    parser.add_argument("--min-serials-per-second", type=float, default=0, help="Exit with status 1 if any run is slower (for CI).")
+    args = parser.parse_args()
+    hw.setup_logging(args.log_level)
+
+    reports = []
+    for serial_count in args.serials:
+        report = run_benchmark(serial_count, args)
+        print_report(report)
+        reports.append(report)
+
+    if args.json_report:
+        with open(args.json_report, "w", encoding="utf-8") as report_file:
+            json.dump(reports, report_file, indent=2)
+        print(f"\nBenchmark report written to '{args.json_report}'.")
+
+    too_slow = [report for report in reports if report["serials_per_second"] < args.min_serials_per_second]
+    if too_slow:
+        print(f"\nFAILED: {len(too_slow)} run(s) below {args.min_serials_per_second} serials/s.")
+        sys.exit(1)
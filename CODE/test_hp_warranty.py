@@ -0,0 +1,161 @@
+import datetime
+import time
+
+import requests
+
+import hp_warranty as hw
+
+
+def result(sn="A", status="Active", device_name="d1", **extra):
+    return dict({
+        hw.output_new_device_name_header: device_name,
+        "Serial Number": sn,
+        hw.output_new_status_header: status,
+        hw.output_new_start_date_header: "January 1, 2023",
+        hw.output_new_end_date_header: "December 31, 2026",
+        "Product Number Used": "N/A",
+    }, **extra)
+
+
+# --- RetryScheduler ---
+def test_final_statuses_are_not_retried():
+    scheduler = hw.RetryScheduler(4)
+    assert scheduler.retry_delay(result(status="Active"), 1) is None
+    assert scheduler.retry_delay(result(status="Serial Not Found"), 1) is None
+    assert scheduler.retries == 0
+
+
+def test_transient_statuses_back_off_until_max_attempts(monkeypatch):
+    monkeypatch.setattr(hw, "retry_max_attempts", 3)
+    scheduler = hw.RetryScheduler(4)
+    first = scheduler.retry_delay(result(status="Navigation Timeout"), 1)
+    second = scheduler.retry_delay(result(status="Navigation Timeout"), 2)
+    assert 0.8 * hw.retry_base_delay_seconds <= first <= 1.2 * hw.retry_base_delay_seconds
+    assert second > first
+    assert scheduler.retry_delay(result(status="Navigation Timeout"), 3) is None
+    assert (scheduler.retries, scheduler.exhausted) == (2, 1)
+
+
+def test_retry_budget_is_shared_by_the_run(monkeypatch):
+    monkeypatch.setattr(hw, "retry_budget_min", 2)
+    monkeypatch.setattr(hw, "retry_budget_ratio", 0.0)
+    scheduler = hw.RetryScheduler(4)
+    delays = [scheduler.retry_delay(result(sn=str(i), status="HTTP Error"), 1) for i in range(3)]
+    assert [delay is not None for delay in delays] == [True, True, False]
+    assert scheduler.exhausted == 1
+
+
+def test_failure_spike_halves_concurrency_and_successes_restore_it(monkeypatch):
+    monkeypatch.setattr(hw, "failure_window_size", 10)
+    monkeypatch.setattr(hw, "failure_spike_rate", 0.5)
+    monkeypatch.setattr(hw, "concurrency_recovery_successes", 3)
+    scheduler = hw.RetryScheduler(8)
+    for i in range(5):
+        scheduler.retry_delay(result(sn=str(i), status="HTTP Error"), 1)
+    assert scheduler.concurrency_limit == 4
+    for i in range(3):
+        scheduler.retry_delay(result(sn=str(i)), 1)
+    assert scheduler.concurrency_limit == 5
+
+
+def test_slots_respect_the_concurrency_limit():
+    scheduler = hw.RetryScheduler(2)
+    assert scheduler.try_acquire_slot()
+    assert scheduler.try_acquire_slot()
+    assert not scheduler.try_acquire_slot()
+    scheduler.release_slot()
+    assert scheduler.try_acquire_slot()
+
+
+# --- HTTP failure triage ---
+def http_status_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+
+def test_http_error_status_separates_client_errors():
+    assert hw.http_error_status(http_status_error(404)) == "HTTP Client Error"
+    assert hw.http_error_status(http_status_error(400)) == "HTTP Client Error"
+    for status_code in (408, 429, 500, 503):
+        assert hw.http_error_status(http_status_error(status_code)) == "HTTP Error"
+    assert hw.http_error_status(requests.ConnectionError("offline")) == "HTTP Error"
+    assert "HTTP Error" in hw.transient_statuses
+    assert "HTTP Client Error" not in hw.transient_statuses
+
+
+# --- SerialWorkStream ---
+def test_work_stream_deduplicates_and_fans_out_duplicates():
+    rows = [("A", "", "d1"), ("B", "", "d2"), ("A", "", "d3")]
+    work_stream = hw.SerialWorkStream(iter(rows))
+    work_items = [work_item for work_item, _ in work_stream]
+    assert work_items == [("A", "", "d1"), ("B", "", "d2")]
+    fanned_out = work_stream.fan_out(result(sn="A", device_name="d1", **{"Lookup Seconds": 1.5}))
+    assert [row[hw.output_new_device_name_header] for row in fanned_out] == ["d1", "d3"]
+    assert work_stream.drain_late_rows() == []
+
+
+def test_duplicate_after_the_result_becomes_a_late_row():
+    rows = iter([("A", "", "d1"), ("B", "", "d2"), ("A", "", "d3")])
+    work_stream = hw.SerialWorkStream(rows)
+    work_items = iter(work_stream)
+    next(work_items)
+    work_stream.fan_out(result(sn="A", device_name="d1", **{"Fetched At": 123.0, "Lookup Seconds": 1.5}))
+    list(work_items)
+    late_rows = work_stream.drain_late_rows()
+    assert len(late_rows) == 1
+    assert late_rows[0][hw.output_new_device_name_header] == "d3"
+    assert late_rows[0]["Fetched At"] == 123.0
+    # Only the late-row fields are kept per serial.
+    assert "Lookup Seconds" not in late_rows[0]
+
+
+def test_resumed_serials_only_add_rows_for_devices_missing_from_the_journal():
+    processed_results = {"A": result(sn="A", device_name="d1")}
+    journaled_rows = {("d1", "A"), ("d2", "A")}
+    rows = iter([("A", "", "d1"), ("A", "", "d2"), ("A", "", "d3"), ("B", "", "d4")])
+    work_stream = hw.SerialWorkStream(rows, processed_results, journaled_rows=journaled_rows)
+    assert [work_item for work_item, _ in work_stream] == [("B", "", "d4")]
+    assert [row[hw.output_new_device_name_header] for row in work_stream.drain_late_rows()] == ["d3"]
+    assert work_stream.skipped == 1
+    assert work_stream.progress_total() == (1, True)
+
+
+# --- Journal TTL ---
+def test_journal_record_expired_follows_the_cache_ttl(monkeypatch):
+    monkeypatch.setattr(hw, "cache_ttl_days", 30)
+    now = time.time()
+    assert hw.journal_record_expired(result(status="Expired", **{"Fetched At": now - 31 * 86400}), now)
+    assert not hw.journal_record_expired(result(status="Expired", **{"Fetched At": now - 86400}), now)
+
+
+def test_journal_record_expired_keeps_errors_and_rows_without_fetch_time():
+    now = time.time()
+    assert not hw.journal_record_expired(result(status="Serial Not Found", **{"Fetched At": 0}), now)
+    assert not hw.journal_record_expired(result(status="Active"), now)
+    assert not hw.journal_record_expired(result(status="Active", **{"Fetched At": "nan"}), now)
+
+
+def test_active_warranty_near_its_end_date_expires_sooner(monkeypatch):
+    monkeypatch.setattr(hw, "cache_near_expiry_ttl_days", 1)
+    now = time.time()
+    end_date = (datetime.date.today() + datetime.timedelta(days=10)).isoformat()
+    record = result(status="Active", **{hw.output_new_end_date_header: end_date, "Fetched At": now - 2 * 86400})
+    assert hw.journal_record_expired(record, now)
+
+
+# --- Dates and run profile ---
+def test_parse_warranty_date_formats():
+    expected = datetime.date(2026, 12, 31)
+    for value in ("December 31, 2026", "Dec 31, 2026", "31 December 2026", "2026-12-31",
+                  "12/31/2026", "31.12.2026", "2026-12-31 00:00:00", datetime.datetime(2026, 12, 31, 8, 0)):
+        assert hw.parse_warranty_date(value) == expected
+    assert hw.parse_warranty_date("Error") is None
+    assert hw.parse_warranty_date(None) is None
+
+
+def test_percentile_is_nearest_rank():
+    assert hw.RunProfiler.percentile([1, 2], 50) == 1
+    assert hw.RunProfiler.percentile(list(range(1, 21)), 95) == 19
+    assert hw.RunProfiler.percentile(list(range(1, 101)), 7) == 7
+    assert hw.RunProfiler.percentile([5], 99) == 5
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+import hp_warranty as hw
+
+
+@pytest.fixture
+def store(tmp_path):
+    shard_store = hw.ShardStore(str(tmp_path / "shards.sqlite"))
+    yield shard_store
+    shard_store.close()
+
+
+def result_row(sn, device_name, status="Active"):
+    return {hw.output_new_device_name_header: device_name, "Serial Number": sn, hw.output_new_status_header: status}
+
+
+def test_split_input_keeps_duplicate_serials_in_their_first_shard(store):
+    rows = [("A", "", "d1"), ("B", "", "d2"), ("A", "", "d3"), ("C", "", "d4")]
+    assert store.split_input(iter(rows), 2) == (2, 3)
+    assert store.shard_rows(1) == [("A", "", "d1"), ("B", "", "d2"), ("A", "", "d3")]
+    assert store.shard_rows(2) == [("C", "", "d4")]
+
+
+def test_claim_hands_out_pending_shards_in_order(store):
+    store.split_input(iter([("A", "", "d1"), ("B", "", "d2")]), 1)
+    assert store.claim_shard("w1", 60) == 1
+    assert store.claim_shard("w2", 60) == 2
+    assert store.claim_shard("w3", 60) is None
+    assert store.status_counts() == {"leased": 2}
+
+
+def test_expired_lease_is_taken_over_and_old_owner_cannot_renew_or_complete(store):
+    store.split_input(iter([("A", "", "d1")]), 1)
+    assert store.claim_shard("slow", -1) == 1
+    assert store.status_counts() == {"expired": 1}
+    assert store.claim_shard("new", 60) == 1
+    assert store.shard_attempts(1) == 2
+    assert not store.renew_lease(1, "slow", 60)
+    assert not store.complete_shard(1, "slow")
+    assert store.renew_lease(1, "new", 60)
+    assert store.complete_shard(1, "new")
+    assert store.status_counts() == {"done": 1}
+
+
+def test_released_shard_waits_for_its_retry_delay(store):
+    store.split_input(iter([("A", "", "d1")]), 1)
+    store.claim_shard("w1", 60)
+    assert store.release_shard(1, "w1", time.time() + 60)
+    assert store.claim_shard("w1", 60) is None
+    assert store.status_counts() == {"pending": 1}
+    assert not store.release_shard(1, "w1", time.time())
+
+
+def test_release_without_counting_the_pass(store):
+    store.split_input(iter([("A", "", "d1")]), 1)
+    store.claim_shard("w1", 60)
+    assert store.release_shard(1, "w1", time.time() - 1, count_pass=False)
+    assert store.shard_attempts(1) == 0
+    assert store.claim_shard("w2", 60) == 1
+
+
+def test_missing_and_transient_results(store):
+    store.split_input(iter([("A", "", "d1"), ("A", "", "d2"), ("B", "", "d3"), ("C", "", "d4")]), 3)
+    assert store.missing_serial_count(1) == 3
+    store.add_results(1, "w1", [result_row("A", "d1"), result_row("A", "d2"), result_row("B", "d3", "HTTP Error")])
+    assert store.missing_serial_count(1) == 1
+    assert store.transient_result_counts() == {1: 1}
+    assert store.transient_result_counts(1) == {1: 1}
+    # Transient results are looked up again when the shard is resumed.
+    assert set(store.shard_results(1)) == {"A"}
+
+
+def test_reopen_shards_reopens_incomplete_and_transient_shards_only(store):
+    store.split_input(iter([("A", "", "d1"), ("B", "", "d2"), ("C", "", "d3")]), 1)
+    for shard_id in (1, 2, 3):
+        store.claim_shard("w1", 60)
+    store.add_results(1, "w1", [result_row("A", "d1")])
+    store.add_results(2, "w1", [result_row("B", "d2", "Navigation Timeout")])
+    store.complete_shard(1, "w1")
+    store.complete_shard(2, "w1")
+    store.complete_shard(3, "w1", "incomplete")
+    assert store.reopen_shards() == 2
+    assert store.status_counts() == {"done": 1, "pending": 2}
+    assert store.shard_attempts(2) == 0
+
+
+def test_worker_stops_claiming_when_no_lookup_worker_can_run(store, monkeypatch):
+    store.split_input(iter([(f"S{i}", "", f"d{i}") for i in range(6)]), 2)
+    monkeypatch.setattr(hw, "run_lookup_engine", lambda work_stream, recorder: False)
+    assert hw.run_shard_worker(store, None) == 0
+    assert store.status_counts() == {"pending": 3}
+    assert [store.shard_attempts(shard_id) for shard_id in (1, 2, 3)] == [0, 0, 0]
+
+
+def test_worker_does_not_complete_a_shard_with_serials_missing(store, monkeypatch):
+    store.split_input(iter([("A", "", "d1"), ("B", "", "d2")]), 2)
+
+    def record_first_serial_only(work_stream, recorder):
+        (sn, _, device_name), _ = next(iter(work_stream))
+        recorder.record(result_row(sn, device_name))
+        return True
+    monkeypatch.setattr(hw, "run_lookup_engine", record_first_serial_only)
+    monkeypatch.setattr(hw, "shard_max_passes", 1)
+    assert hw.run_shard_worker(store, None) == 0
+    assert store.status_counts() == {"incomplete": 1}
+    assert store.missing_serial_count(1) == 1